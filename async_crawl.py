@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import random
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+
+import metrics
+from fetch_engine import HTTP_TIMEOUT, USER_AGENT
+from work_scheduler import UNIT_ATTEMPTS, IncompleteCrawlError
+
+# Constants
+MAX_IN_FLIGHT = 100
+PER_HOST_RATE = 10.0  # requests per second
+PER_HOST_BURST = 20
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Async token bucket refilled at `rate` tokens per second up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.sleep_seconds = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+                self.sleep_seconds += delay
+                metrics.inc("rate_limiter_sleep_seconds_total", delay)
+                await asyncio.sleep(delay)
+
+
+class HttpStatusError(Exception):
+    def __init__(self, url, status):
+        super().__init__(f"HTTP {status} for {url}")
+        self.url = url
+        self.status = status
+
+
+class AsyncFetcher:
+    """aiohttp client with a global in-flight cap and a rate limit per host."""
+
+    def __init__(
+        self,
+        max_in_flight=MAX_IN_FLIGHT,
+        per_host_rate=PER_HOST_RATE,
+        per_host_burst=PER_HOST_BURST,
+        max_retries=MAX_RETRIES,
+    ):
+        self.max_in_flight = max_in_flight
+        self.per_host_rate = per_host_rate
+        self.per_host_burst = per_host_burst
+        self.max_retries = max_retries
+        self.retries = 0
+        self.requests = 0
+
+        self._buckets = {}
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_in_flight),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT * 3),
+            headers={"User-Agent": USER_AGENT, "Accept": "text/html"},
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+
+    def _bucket(self, url):
+        host = urlparse(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.per_host_rate, self.per_host_burst)
+        return self._buckets[host]
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+    async def get_html(self, url):
+        bucket = self._bucket(url)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            retry_after = None
+            async with self._in_flight:
+                self.requests += 1
+                try:
+                    with metrics.timer("page_load_seconds", engine="async"):
+                        async with self._session.get(url) as response:
+                            if response.status < 400:
+                                return await response.text()
+                            if response.status not in RETRY_STATUSES:
+                                raise HttpStatusError(url, response.status)
+                            retry_after = response.headers.get("Retry-After")
+                            error = HttpStatusError(url, response.status)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+
+            if attempt == self.max_retries:
+                raise error
+            self.retries += 1
+            metrics.inc("http_retries_total", engine="async")
+            delay = self._backoff(attempt, retry_after)
+            logging.warning(f"Retrying {url} in {delay:.1f}s after: {error}")
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limit_sleep_seconds": sum(
+                bucket.sleep_seconds for bucket in self._buckets.values()
+            ),
+        }
+
+
+async def run_units(units, handler, workers=MAX_IN_FLIGHT, attempts=UNIT_ATTEMPTS):
+    # handler(unit, submit) may submit follow-up units; returns [(unit, result)]
+    # and raises IncompleteCrawlError if a unit failed every attempt
+    queue = asyncio.Queue()
+    for unit in units:
+        queue.put_nowait(unit)
+    results = []
+    tries = {}  # by id(), units may be unhashable dicts
+    failed = []
+
+    async def worker():
+        while True:
+            unit = await queue.get()
+            try:
+                results.append((unit, await handler(unit, queue.put_nowait)))
+                tries.pop(id(unit), None)
+            except Exception as e:
+                count = tries[id(unit)] = tries.get(id(unit), 0) + 1
+                if count < attempts:
+                    logging.warning(f"Work unit {unit} failed, retrying: {e}")
+                    queue.put_nowait(unit)
+                else:
+                    logging.error(f"Work unit {unit} failed after {count} tries: {e}")
+                    failed.append(unit)
+            finally:
+                queue.task_done()
+
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    await queue.join()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if failed:
+        raise IncompleteCrawlError(failed)
+    return results
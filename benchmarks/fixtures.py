@@ -0,0 +1,218 @@
+import ast
+import hashlib
+import html
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from fetch_engine import HttpEngine
+
+# Constants
+RAW_CSV = "data/raw/raw_school_data.csv"
+FIXTURES_PATH = "benchmarks/fixtures"  # recorded pages, used instead of synthetic ones
+CARDS_PER_PAGE = 25
+REVIEWS_PER_PAGE = 20
+LAST_PAGE = 40
+SUBRATING_COLUMNS = {
+    "Academic Progress": "Academic Progress",
+    "Test Scores": "Test Scores",
+    "Equity": "Equity Scores",
+}
+REVIEW_SENTENCES = [
+    "The teachers are caring and know every student by name.",
+    "Communication from the front office could be a lot better.",
+    "My son has grown so much in reading and math this year.",
+    "Pickup and drop-off traffic is a nightmare every single day.",
+    "Great after school programs and a very involved PTA.",
+    "We left after one year because of bullying that was never addressed.",
+]
+
+
+def load_raw_schools(path=RAW_CSV):
+    return pd.read_csv(path)
+
+
+def text(value):
+    return "" if pd.isna(value) else html.escape(str(value).strip())
+
+
+def render_card(row):
+    chips = "".join(
+        f'<span class="filter-chip">{html.escape(chip)}</span>'
+        for chip in ast.literal_eval(row["School Types"])
+    )
+    subratings = "".join(
+        f'<div class="subrating"><span class="name">{name}</span>'
+        f'<span class="circle-rating--xx-small">{text(row[column])}</span></div>'
+        for name, column in SUBRATING_COLUMNS.items()
+        if not pd.isna(row[column])
+    )
+    digest = hashlib.md5(str(row["School Name"]).encode()).hexdigest()
+    review_count = int(digest, 16) % 40
+    return (
+        '<li class="school-card">'
+        f'<div class="header"><a class="name" href="{text(row["School Link"])}">'
+        f'{text(row["School Name"])}</a></div>'
+        f'<div class="address">{text(row["Address"])} • District</div>'
+        f'<div class="gs-rating"><div class="circle-rating--search-page">'
+        f'{text(row["GSO Rating"])}/10</div></div>'
+        f'<div class="subratings">{subratings}</div>'
+        f'<div class="filter-chips">{chips}</div>'
+        '<div class="user-rating"><div class="five-stars">'
+        f'<span class="rating-value">{text(row["Star Rating"])}</span></div>'
+        f'<a href="{text(row["Review Link"])}">{review_count} reviews</a></div>'
+        "</li>"
+    )
+
+
+def render_listing_page(rows, page, last_page=LAST_PAGE):
+    pager = "".join(
+        f'<a href="?page={number}">{number}</a>' for number in range(1, last_page + 1)
+    )
+    if page < last_page:
+        pager += f'<a class="next_page" href="?page={page + 1}">Next</a>'
+    cards = "".join(render_card(row) for row in rows)
+    return (
+        "<!doctype html><html><head><title>Schools</title></head><body>"
+        f'<ol class="school-list">{cards}</ol><div class="pagination">{pager}</div>'
+        "</body></html>"
+    )
+
+
+def render_review_page(seed):
+    rng = np.random.default_rng(seed)
+    reviews = "".join(
+        '<div class="five-star-review"><div class="comment"><span>'
+        + " ".join(rng.choice(REVIEW_SENTENCES, size=3))
+        + "</span></div></div>"
+        for _ in range(REVIEWS_PER_PAGE)
+    )
+    return (
+        "<!doctype html><html><body>"
+        f'<div class="review-list-column">{reviews}</div>'
+        "</body></html>"
+    )
+
+
+def recorded_pages(kind, fixtures_path=FIXTURES_PATH):
+    folder = os.path.join(fixtures_path, kind)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name for name in os.listdir(folder) if name.endswith(".html"))
+
+
+def write_fixtures(root, pages=LAST_PAGE, fixtures_path=FIXTURES_PATH):
+    """Fill root/listing and root/reviews with pages to serve.
+
+    Recorded pages under benchmarks/fixtures/<kind>/ are copied as-is; kinds
+    without recordings get synthetic pages built from the raw school CSV,
+    using the same markup the scraper's selectors expect.
+    """
+    written = {}
+    schools = None
+    for kind in ("listing", "reviews"):
+        os.makedirs(os.path.join(root, kind), exist_ok=True)
+        names = recorded_pages(kind, fixtures_path)
+        if names:
+            for name in names:
+                with open(os.path.join(fixtures_path, kind, name), "rb") as source:
+                    content = source.read()
+                with open(os.path.join(root, kind, name), "wb") as target:
+                    target.write(content)
+            written[kind] = names
+            continue
+
+        if schools is None:
+            schools = load_raw_schools().to_dict("records")
+        names = []
+        for page in range(1, pages + 1):
+            if kind == "listing":
+                start = (page - 1) * CARDS_PER_PAGE % len(schools)
+                rows = schools[start : start + CARDS_PER_PAGE]
+                content = render_listing_page(rows, page, pages)
+            else:
+                content = render_review_page(page)
+            name = f"page-{page}.html"
+            with open(os.path.join(root, kind, name), "w", encoding="utf-8") as target:
+                target.write(content)
+            names.append(name)
+        written[kind] = names
+    return written
+
+
+def record_fixture(url, kind, name, fixtures_path=FIXTURES_PATH):
+    # Save a live page once so later benchmark runs can replay it offline
+    engine = HttpEngine(pool_size=1)
+    try:
+        content = engine.get_html(url)
+    finally:
+        engine.close()
+    folder = os.path.join(fixtures_path, kind)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    with open(path, "w", encoding="utf-8") as target:
+        target.write(content)
+    return path
+
+
+def synthetic_raw_table(rows, path=RAW_CSV, seed=0):
+    """RAW_SCHOOL_INFO-shaped frame of `rows` rows, tiled from the raw CSV.
+
+    Street numbers are shifted on every repeat so addresses stay distinct and
+    the geocode path sees realistic cache misses.
+    """
+    base = load_raw_schools(path)
+    repeats = -(-rows // len(base))
+    df = pd.concat([base] * repeats, ignore_index=True).iloc[:rows].copy()
+
+    copy_number = np.arange(rows) // len(base)
+    shifted = copy_number > 0
+    df.loc[shifted, "Address"] = [
+        f"{number}{address}"
+        for number, address in zip(copy_number[shifted], df.loc[shifted, "Address"])
+    ]
+
+    rng = np.random.default_rng(seed)
+    df = df.rename(
+        columns={
+            "School Name": "SCHOOL_NAME",
+            "Address": "ADDRESS",
+            "GSO Rating": "GS_RATING",
+            "Academic Progress": "ACADEMIC_PROGRESS",
+            "Test Scores": "TEST_SCORES",
+            "Equity Scores": "EQUITY_SCORES",
+            "School Types": "SCHOOL_TYPES",
+            "Star Rating": "STAR_RATING",
+            "Review Link": "REVIEW_LINK",
+            "School Link": "SCHOOL_LINK",
+            "City": "CITY",
+        }
+    )
+    df["REVIEW_COUNT"] = rng.integers(0, 40, size=rows)
+    df["BATCH_ID"] = "benchmark"
+    df["EXTRACTED_AT"] = pd.Timestamp("2024-01-01", tz="UTC")
+    return df
+
+
+class StubGeocoder:
+    """Deterministic offline geocoder with an optional fixed per-call delay."""
+
+    def __init__(self, delay=0.0, miss_rate=0.05):
+        self.delay = delay
+        self.miss_rate = miss_rate
+        self.calls = 0
+
+    def geocode(self, address):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        digest = int(hashlib.md5(str(address).encode()).hexdigest(), 16)
+        if (digest % 1000) / 1000 < self.miss_rate:
+            return (None, None)
+        # Somewhere in Southern California
+        return (
+            32.5 + (digest % 30000) / 10000,
+            -119.5 + (digest // 30000 % 30000) / 10000,
+        )
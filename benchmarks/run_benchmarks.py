@@ -0,0 +1,262 @@
+"""Offline benchmarks for the scraper and transform hot paths.
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --sizes 10000 --browser
+    python -m benchmarks.run_benchmarks --baseline benchmarks/results/baseline.json
+
+Pages are served from a local HTTP server, geocoding goes to a stub, and the
+transform runs on synthetic tables scaled up from data/raw/raw_school_data.csv,
+so nothing touches greatschools.org, Nominatim or Snowflake. Every stage runs
+in its own process so peak RSS is per stage.
+"""
+
+import argparse
+import http.server
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import StubGeocoder, synthetic_raw_table, write_fixtures
+
+# Constants
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_ROUNDS = 3
+RESULTS_PATH = "benchmarks/results/latest.json"
+REGRESSION_TOLERANCE = 0.20  # flag stages more than 20% slower than the baseline
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures(root):
+    handler = partial(QuietHandler, directory=root)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(name, items, rows, seconds, latencies):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "stage": name,
+        "items": items,
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "items_per_sec": round(items / seconds, 2) if seconds else None,
+        "rows_per_sec": round(rows / seconds, 2) if seconds else None,
+        "p50_ms": (
+            round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None
+        ),
+        "p99_ms": (
+            round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None
+        ),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def bench_listing_http(urls, rounds):
+    from fetch_engine import HttpEngine
+    from school_scraper import read_listing_page_http
+
+    engine = HttpEngine()
+    load_timestamp = pd.Timestamp.now(tz="UTC")
+    latencies, rows = [], 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for url in urls:
+            page_started = time.perf_counter()
+            page = read_listing_page_http(
+                engine, url, "Benchmark", "bench", load_timestamp
+            )
+            latencies.append(time.perf_counter() - page_started)
+            rows += len(page[0]) if page else 0
+    seconds = time.perf_counter() - started
+    engine.close()
+    return summarize("listing_http", len(latencies), rows, seconds, latencies)
+
+
+def bench_reviews_http(urls, rounds):
+    from fetch_engine import HttpEngine
+    from school_reviews_scraper import get_reviews_http
+
+    engine = HttpEngine()
+    latencies, rows = [], 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for url in urls:
+            page_started = time.perf_counter()
+            reviews = get_reviews_http(engine, url)
+            latencies.append(time.perf_counter() - page_started)
+            rows += len(reviews or [])
+    seconds = time.perf_counter() - started
+    engine.close()
+    return summarize("reviews_http", len(latencies), rows, seconds, latencies)
+
+
+def bench_listing_browser(urls, rounds):
+    # Needs Chrome and a chromedriver; exercises the execute_script extraction path
+    from driver_pool import resolve_driver_path
+    from school_scraper import init_driver, read_listing_page
+
+    load_timestamp = pd.Timestamp.now(tz="UTC")
+    latencies, rows = [], 0
+    startup = time.perf_counter()
+    driver = init_driver(True, resolve_driver_path())
+    startup = time.perf_counter() - startup
+    try:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for url in urls:
+                page_started = time.perf_counter()
+                page = read_listing_page(
+                    driver, url, "Benchmark", "bench", load_timestamp
+                )
+                latencies.append(time.perf_counter() - page_started)
+                rows += len(page[0])
+        seconds = time.perf_counter() - started
+    finally:
+        driver.quit()
+    result = summarize("listing_browser", len(latencies), rows, seconds, latencies)
+    result["driver_startup_ms"] = round(startup * 1000, 1)
+    return result
+
+
+def bench_transform(size, chunk_size, geocode_delay):
+    from geocode_cache import GeocodeCache
+    from school_transform import preprocess_and_geoencode
+
+    df = synthetic_raw_table(size)
+    geocoder = StubGeocoder(delay=geocode_delay)
+    latencies = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = GeocodeCache(os.path.join(cache_dir, "geocode.sqlite3"))
+        started = time.perf_counter()
+        for start in range(0, size, chunk_size):
+            chunk_started = time.perf_counter()
+            preprocess_and_geoencode(
+                df.iloc[start : start + chunk_size].copy(), cache, geocoder
+            )
+            latencies.append(time.perf_counter() - chunk_started)
+        seconds = time.perf_counter() - started
+        cache.close()
+    result = summarize(f"transform_{size}", len(latencies), size, seconds, latencies)
+    result["geocoder_calls"] = geocoder.calls
+    return result
+
+
+def run_isolated(function, *args):
+    # A fresh interpreter per stage keeps peak RSS from leaking between stages
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def compare(results, baseline_path, tolerance=REGRESSION_TOLERANCE):
+    with open(baseline_path) as source:
+        baseline = {stage["stage"]: stage for stage in json.load(source)["stages"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["stage"])
+        if (
+            not previous
+            or not previous.get("rows_per_sec")
+            or not result["rows_per_sec"]
+        ):
+            continue
+        change = result["rows_per_sec"] / previous["rows_per_sec"] - 1
+        if change < -tolerance:
+            regressions.append((result["stage"], change))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="comma separated synthetic table sizes for the transform stage",
+    )
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--geocode-delay", type=float, default=0.0)
+    parser.add_argument(
+        "--browser", action="store_true", help="also run the Selenium stage"
+    )
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from storage import CHUNK_SIZE
+
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    chunk_size = args.chunk_size or CHUNK_SIZE
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        pages = write_fixtures(root)
+        server, base_url = serve_fixtures(root)
+        try:
+            listing_urls = [f"{base_url}/listing/{name}" for name in pages["listing"]]
+            review_urls = [f"{base_url}/reviews/{name}" for name in pages["reviews"]]
+            results.append(run_isolated(bench_listing_http, listing_urls, args.rounds))
+            results.append(run_isolated(bench_reviews_http, review_urls, args.rounds))
+            if args.browser:
+                results.append(
+                    run_isolated(bench_listing_browser, listing_urls, args.rounds)
+                )
+        finally:
+            server.shutdown()
+
+    for size in sizes:
+        results.append(
+            run_isolated(bench_transform, size, chunk_size, args.geocode_delay)
+        )
+
+    for result in results:
+        print(
+            f"{result['stage']:<20} {result['items_per_sec']:>10} items/s"
+            f" {result['rows_per_sec']:>12} rows/s  p50 {result['p50_ms']} ms"
+            f"  p99 {result['p99_ms']} ms  peak RSS {result['peak_rss_mb']} MB"
+        )
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as target:
+        json.dump(
+            {"created_at": pd.Timestamp.now(tz="UTC").isoformat(), "stages": results},
+            target,
+            indent=2,
+        )
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline)
+        for stage, change in regressions:
+            print(f"REGRESSION {stage}: {change:.0%} rows/sec vs baseline")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import json
+from uuid import uuid4
+
+import pandas as pd
+
+from sqlite_store import SqliteStore
+
+# Constants
+CHECKPOINT_PATH = "data/checkpoints/crawl.sqlite3"
+
+SCHEMA = """
+create table if not exists runs (
+    batch_id text primary key,
+    name text not null,
+    started_at text not null,
+    finished_at text
+);
+create table if not exists listing_pages (
+    batch_id text not null,
+    city text not null,
+    grade text not null,
+    page integer not null,
+    last_page integer not null,
+    has_next integer not null,
+    records text not null,
+    primary key (batch_id, city, grade, page)
+);
+create table if not exists review_links (
+    batch_id text not null,
+    review_link text not null,
+    reviews text not null,
+    loaded integer not null default 0,
+    primary key (batch_id, review_link)
+);
+"""
+
+
+class CheckpointStore(SqliteStore):
+    """Durable record of completed crawl units so a restarted run skips them.
+
+    Listing pages are keyed by (batch_id, city, grade, page) and review pages by
+    (batch_id, review_link). An unfinished run is resumed under its original
+    batch_id until finish_run is called.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        super().__init__(path, SCHEMA, synchronous="normal")
+
+    def start_run(self, name):
+        # Resume the latest unfinished run with this name, or start a new one
+        with self._lock:
+            row = self._conn.execute(
+                "select batch_id, started_at from runs"
+                " where name = ? and finished_at is null"
+                " order by started_at desc limit 1",
+                (name,),
+            ).fetchone()
+            if row:
+                return row[0], pd.Timestamp(row[1])
+
+            batch_id = str(uuid4())
+            started_at = pd.Timestamp.now(tz="UTC")
+            with self._conn:
+                self._conn.execute(
+                    "insert into runs (batch_id, name, started_at) values (?, ?, ?)",
+                    (batch_id, name, started_at.isoformat()),
+                )
+            return batch_id, started_at
+
+    def finish_run(self, batch_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "update runs set finished_at = ? where batch_id = ?",
+                (pd.Timestamp.now(tz="UTC").isoformat(), batch_id),
+            )
+
+    def load_listing_page(self, batch_id, unit):
+        with self._lock:
+            row = self._conn.execute(
+                "select records, last_page, has_next from listing_pages"
+                " where batch_id = ? and city = ? and grade = ? and page = ?",
+                (batch_id, unit.city, unit.grade, unit.page),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], bool(row[2])
+
+    def save_listing_page(self, batch_id, unit, page):
+        schools_list, last_page, has_next = page
+        records = json.dumps(schools_list, default=str)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "insert or replace into listing_pages"
+                " (batch_id, city, grade, page, last_page, has_next, records)"
+                " values (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    batch_id,
+                    unit.city,
+                    unit.grade,
+                    unit.page,
+                    last_page,
+                    has_next,
+                    records,
+                ),
+            )
+
+    def completed_reviews(self, batch_id):
+        # {review_link: {"reviews": [...], "loaded": bool}}
+        with self._lock:
+            rows = self._conn.execute(
+                "select review_link, reviews, loaded from review_links"
+                " where batch_id = ?",
+                (batch_id,),
+            ).fetchall()
+        return {
+            review_link: {"reviews": json.loads(reviews), "loaded": bool(loaded)}
+            for review_link, reviews, loaded in rows
+        }
+
+    def save_reviews(self, batch_id, review_link, reviews):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "insert or replace into review_links (batch_id, review_link, reviews)"
+                " values (?, ?, ?)",
+                (batch_id, review_link, json.dumps(reviews)),
+            )
+
+    def mark_reviews_loaded(self, batch_id, review_links):
+        # Loaded reviews are already in the warehouse and must not be replayed
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "update review_links set loaded = 1"
+                " where batch_id = ? and review_link = ?",
+                [(batch_id, review_link) for review_link in review_links],
+            )
@@ -0,0 +1,411 @@
+"""Coordinator/worker crawl across any number of machines.
+
+The coordinator puts crawl units into a shared work queue; workers on every
+node lease units, crawl them and write the results straight to the warehouse:
+
+    python distributed_crawl.py coordinator --stage schools --cities cities.txt
+    python distributed_crawl.py worker --stage schools --threads 16   # on each node
+    python distributed_crawl.py status
+
+The queue (BRIGHTFUTURES_QUEUE or --queue) is a Redis URL such as
+redis://queue-host:6379/0 that every node can reach, or a SQLite file for workers
+on a single host. The SQLite file runs in WAL mode, which does not work over NFS
+or other network file systems, so it must not be shared between machines.
+Listing pages discovered while crawling are queued as new units, so any node can
+pick them up. Units are delivered at least once: a worker that dies mid-unit loses
+its lease after the visibility timeout and the unit runs again elsewhere, while
+live workers keep renewing the leases they hold. Listing pages and reviews are
+deduplicated before they are written, so a unit that runs twice is loaded once.
+"""
+
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+from uuid import uuid4
+
+import pandas as pd
+
+import metrics
+from driver_pool import DriverPool, PAGES_PER_DRIVER, resolve_driver_path
+from fetch_engine import HttpEngine
+from review_dedup import RedisReviewDedup, ReviewDedup
+from school_reviews_scraper import (
+    REVIEW_TABLE,
+    build_review_rows,
+    fetch_reviews,
+    init_review_driver,
+    load_review_targets,
+    open_review_dedup,
+    select_changed_schools,
+)
+from school_scraper import HEADLESS_MODE, crawl_unit, init_driver
+from storage import get_storage
+from wait_engine import waits
+from work_queue import QUEUE_PATH, RedisWorkQueue, open_queue
+from work_scheduler import CrawlUnit
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+# Constants
+LISTING_QUEUE = "listings"
+REVIEW_QUEUE = "reviews"
+LISTING_TABLE = "RAW_SCHOOL_INFO"
+GRADES = {"e": "Elementary", "m": "Middle", "h": "High"}
+WORKER_THREADS = 8
+IDLE_POLL_SECONDS = 2
+# Results are buffered per thread and loaded in one write; a heartbeat renews
+# the leases of buffered and running units until they are completed
+FLUSH_ROWS = 2000
+FLUSH_SECONDS = 60
+HEARTBEATS_PER_TIMEOUT = 3
+# Kept next to a SQLite queue so its workers deduplicate against one store
+REVIEW_HASH_FILE = "review_hashes.sqlite3"
+
+
+def shared_dedup_store(queue):
+    # Review hashes and loaded listing pages for every worker, on the same
+    # backend as the queue
+    if isinstance(queue, RedisWorkQueue):
+        return RedisReviewDedup(queue.url)
+    return ReviewDedup(
+        os.path.join(os.path.dirname(queue.path) or ".", REVIEW_HASH_FILE)
+    )
+
+
+def read_cities(path):
+    with open(path) as file:
+        return [city.strip() for city in file.read().split("\n") if city.strip()]
+
+
+def listing_payload(unit, batch_id, load_timestamp):
+    return dict(
+        unit._asdict(), batch_id=batch_id, extracted_at=load_timestamp.isoformat()
+    )
+
+
+def review_payload(row, batch_id, load_timestamp):
+    return {
+        "review_link": row["REVIEW_LINK"],
+        "school_name": row["SCHOOL_NAME"],
+        "address": row["ADDRESS"],
+        "fingerprint": str(row["FINGERPRINT"]),
+        "batch_id": batch_id,
+        "extracted_at": load_timestamp.isoformat(),
+    }
+
+
+def enqueue_listings(queue, cities, grades=GRADES):
+    batch_id, load_timestamp = str(uuid4()), pd.Timestamp.now(tz="UTC")
+    added = queue.put_many(
+        LISTING_QUEUE,
+        [
+            listing_payload(CrawlUnit(city, grade_key), batch_id, load_timestamp)
+            for city in cities
+            for grade_key in grades
+        ],
+    )
+    logging.info(f"Queued {added} listing units for batch {batch_id}")
+    return batch_id
+
+
+def enqueue_reviews(queue, storage, incremental=True):
+    # Seed the shared dedup store here once, so workers never scan the warehouse
+    dedup = open_review_dedup(storage, shared_dedup_store(queue))
+    scraped_fingerprints = dedup.scraped_fingerprints()
+    dedup.close()
+
+    schools = load_review_targets(storage)
+    if incremental:
+        schools = select_changed_schools(schools, scraped_fingerprints)
+
+    batch_id, load_timestamp = str(uuid4()), pd.Timestamp.now(tz="UTC")
+    added = queue.put_many(
+        REVIEW_QUEUE,
+        [
+            review_payload(row, batch_id, load_timestamp)
+            for row in schools.to_dict("records")
+        ],
+    )
+    logging.info(f"Queued {added} review units for batch {batch_id}")
+    return batch_id
+
+
+def crawl_listing(payload, queue, pool, engine):
+    unit = CrawlUnit(
+        payload["city"], payload["grade"], payload["page"], payload["chained"]
+    )
+    batch_id = payload["batch_id"]
+    load_timestamp = pd.Timestamp(payload["extracted_at"])
+
+    # Follow-up pages go back to the shared queue instead of this node's deque
+    def submit(next_unit):
+        queue.put(LISTING_QUEUE, listing_payload(next_unit, batch_id, load_timestamp))
+
+    return crawl_unit(unit, submit, pool, engine, batch_id, load_timestamp)
+
+
+def crawl_review(payload, queue, pool, engine):
+    row = {"SCHOOL_NAME": payload["school_name"], "ADDRESS": payload["address"]}
+    individual_reviews = fetch_reviews(payload["review_link"], engine, pool)
+    return build_review_rows(
+        row,
+        individual_reviews or [],
+        payload["batch_id"],
+        pd.Timestamp(payload["extracted_at"]),
+    )
+
+
+def listing_page_key(payload):
+    # A listing page's rows are the same however often its unit is delivered
+    return "|".join(
+        str(payload[field]) for field in ("batch_id", "city", "grade", "page")
+    )
+
+
+def listing_writer(storage, write_lock, dedup):
+    def write(payloads, results):
+        with write_lock:
+            # Units are delivered at least once, so skip pages already loaded
+            keys = [listing_page_key(payload) for payload in payloads]
+            loaded = dedup.loaded_pages(keys)
+            fresh, rows = set(), []
+            for key, unit_rows in zip(keys, results):
+                if key not in loaded and key not in fresh:
+                    fresh.add(key)
+                    rows.extend(unit_rows)
+            metrics.inc("listing_pages_duplicate_total", len(keys) - len(fresh))
+            if rows:
+                storage.write(pd.DataFrame(rows), LISTING_TABLE)
+            dedup.mark_pages_loaded(fresh)
+
+    return write
+
+
+def review_writer(storage, write_lock, dedup):
+    def write(payloads, results):
+        rows = [row for unit_rows in results for row in unit_rows]
+        with write_lock:
+            reviews_df = dedup.new_reviews(pd.DataFrame(rows))
+            if not reviews_df.empty:
+                storage.write(
+                    reviews_df.drop(columns=["school_id", "content_hash"]),
+                    REVIEW_TABLE,
+                )
+                for batch_id, batch in reviews_df.groupby("batch_id"):
+                    dedup.mark_seen(batch, batch_id)
+            # Also schools without reviews, so they are not scraped again unchanged
+            for payload in payloads:
+                dedup.mark_scraped(
+                    {payload["review_link"]: payload["fingerprint"]},
+                    payload["batch_id"],
+                )
+
+    return write
+
+
+class LeaseHeartbeat:
+    """Renews a worker's held leases in the background.
+
+    Units stay leased while they run and while their rows wait in the flush
+    buffer; without renewal one slow unit could outlast the visibility
+    timeout of everything buffered before it and hand those units to other
+    workers. Leases are extended HEARTBEATS_PER_TIMEOUT times per timeout.
+    """
+
+    def __init__(self, queue, worker_id):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.interval = queue.visibility_timeout / HEARTBEATS_PER_TIMEOUT
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                held = list(self._held)
+            for unit_id in held:
+                # False once the unit is completed or the lease was already
+                # lost; complete() counts the lost ones
+                self.queue.extend(unit_id, self.worker_id)
+
+    def hold(self, unit_id):
+        with self._lock:
+            self._held.add(unit_id)
+
+    def release(self, unit_ids):
+        with self._lock:
+            self._held.difference_update(unit_ids)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stopped.set()
+        self._thread.join()
+
+
+def work(queue, queue_name, worker_id, handle, write):
+    """Lease, crawl and load units until the queue is drained."""
+    with LeaseHeartbeat(queue, worker_id) as heartbeat:
+        leased, payloads, results, rows = [], [], [], 0
+        flushed_at = time.monotonic()
+
+        def flush():
+            nonlocal leased, payloads, results, rows, flushed_at
+            try:
+                if leased:
+                    write(payloads, results)
+            except Exception as e:
+                # Nothing from these units was stored, hand them back for a retry
+                logging.warning(f"{worker_id} failed to load {rows} rows: {e}")
+                for unit_id in leased:
+                    queue.fail(unit_id, worker_id, e)
+                metrics.inc("queue_units_failed_total", len(leased), queue=queue_name)
+            else:
+                completed = 0
+                for unit_id in leased:
+                    if queue.complete(unit_id, worker_id):
+                        completed += 1
+                    else:
+                        # Lease expired and the unit went to another worker;
+                        # its rows are deduplicated when that worker loads them
+                        metrics.inc("queue_leases_lost_total", queue=queue_name)
+                metrics.inc("queue_units_completed_total", completed, queue=queue_name)
+            heartbeat.release(leased)
+            leased, payloads, results, rows = [], [], [], 0
+            flushed_at = time.monotonic()
+
+        while True:
+            lease = queue.lease(queue_name, worker_id)
+            if lease is None:
+                flush()
+                if queue.drained(queue_name):
+                    return
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+
+            unit_id, payload = lease
+            heartbeat.hold(unit_id)
+            try:
+                with metrics.timer("queue_unit_seconds", queue=queue_name):
+                    unit_rows = handle(payload)
+            except Exception as e:
+                logging.warning(f"{worker_id} failed unit {unit_id} ({payload}): {e}")
+                heartbeat.release([unit_id])
+                queue.fail(unit_id, worker_id, e)
+                metrics.inc("queue_units_failed_total", queue=queue_name)
+                continue
+
+            leased.append(unit_id)
+            payloads.append(payload)
+            results.append(unit_rows)
+            rows += len(unit_rows)
+            if rows >= FLUSH_ROWS or time.monotonic() - flushed_at >= FLUSH_SECONDS:
+                flush()
+
+
+def run_worker(stage, threads=WORKER_THREADS, queue_path=QUEUE_PATH):
+    queue = open_queue(queue_path)
+    storage = get_storage()
+    write_lock = threading.Lock()
+    engine = HttpEngine(pool_size=threads)
+    dedup = shared_dedup_store(queue)
+
+    if stage == "reviews":
+        queue_name, crawl = REVIEW_QUEUE, crawl_review
+        write = review_writer(storage, write_lock, dedup)
+
+        def driver_factory():
+            return init_review_driver(resolve_driver_path())
+
+    else:
+        queue_name, crawl = LISTING_QUEUE, crawl_listing
+        write = listing_writer(storage, write_lock, dedup)
+
+        def driver_factory():
+            return init_driver(HEADLESS_MODE, resolve_driver_path())
+
+    # Browsers only start for pages the HTTP engine cannot serve
+    node = f"{socket.gethostname()}-{os.getpid()}"
+    with DriverPool(driver_factory, size=threads, max_pages=PAGES_PER_DRIVER) as pool:
+
+        def handle(payload):
+            return crawl(payload, queue, pool, engine)
+
+        workers = [
+            threading.Thread(
+                target=work, args=(queue, queue_name, f"{node}-{i}", handle, write)
+            )
+            for i in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        logging.info(f"Driver pool stats: {pool.stats()}")
+
+    logging.info(f"Adaptive wait stats: {waits.stats()}")
+    logging.info(f"Queue {queue_name}: {queue.counts(queue_name)}")
+    if stage == "reviews":
+        logging.info(f"Review dedup stats: {dedup.stats()}")
+    dedup.close()
+    engine.close()
+    queue.close()
+    storage.close()
+    logging.info(f"Metrics report: {metrics.write_report(f'{stage}-{node}')}")
+
+
+def print_status(queue):
+    for queue_name in (LISTING_QUEUE, REVIEW_QUEUE):
+        print(f"{queue_name}: {queue.counts(queue_name)}")
+        for failure in queue.failures(queue_name):
+            print(
+                f"  failed after {failure['attempts']} attempts:"
+                f" {failure['payload']} ({failure['error']})"
+            )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("role", choices=["coordinator", "worker", "status"])
+    parser.add_argument("--stage", choices=["schools", "reviews"], default="schools")
+    parser.add_argument("--cities", default="cities.txt")
+    parser.add_argument("--threads", type=int, default=WORKER_THREADS)
+    parser.add_argument("--queue", default=QUEUE_PATH)
+    parser.add_argument(
+        "--full-refresh",
+        action="store_true",
+        help="queue reviews for every school, not only changed ones",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.role == "worker":
+        run_worker(args.stage, args.threads, args.queue)
+        return
+
+    queue = open_queue(args.queue)
+    if args.role == "coordinator":
+        if args.stage == "reviews":
+            storage = get_storage()
+            enqueue_reviews(queue, storage, incremental=not args.full_refresh)
+            storage.close()
+        else:
+            enqueue_listings(queue, read_cities(args.cities))
+    print_status(queue)
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from webdriver_manager.chrome import ChromeDriverManager
+
+# Constants
+PAGES_PER_DRIVER = 50
+
+
+@lru_cache(maxsize=None)
+def resolve_driver_path():
+    # ChromeDriverManager hits the network and the local cache, so only do it once per process
+    return ChromeDriverManager().install()
+
+
+class DriverPool:
+    """Bounded pool of warm WebDriver instances shared by worker threads."""
+
+    def __init__(self, factory, size, max_pages=PAGES_PER_DRIVER):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._closed = False
+
+        self._started_at = time.monotonic()
+        self._busy_seconds = 0.0
+        self._wait_seconds = 0.0
+        self._in_use = 0
+        self._created = 0
+        self._recycled = 0
+        self._crashed = 0
+        self._leases = 0
+
+    def _create(self):
+        driver = self.factory()
+        with self._lock:
+            self._created += 1
+            self._pages[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Error quitting driver: {e}")
+
+    @contextmanager
+    def lease(self):
+        if self._closed:
+            raise RuntimeError("Driver pool is closed")
+
+        wait_start = time.monotonic()
+        self._slots.acquire()
+        lease_start = time.monotonic()
+
+        try:
+            driver = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                driver = self._create()
+            except Exception:
+                self._slots.release()
+                raise
+
+        with self._lock:
+            self._wait_seconds += lease_start - wait_start
+            self._in_use += 1
+            self._leases += 1
+
+        healthy = True
+        try:
+            yield driver
+        except TimeoutException:
+            # A slow page is not a broken browser
+            raise
+        except WebDriverException:
+            healthy = False
+            raise
+        finally:
+            with self._lock:
+                self._busy_seconds += time.monotonic() - lease_start
+                self._in_use -= 1
+            self._release(driver, healthy)
+            self._slots.release()
+
+    def _release(self, driver, healthy):
+        with self._lock:
+            pages = self._pages.get(id(driver), 0)
+            if not healthy:
+                self._crashed += 1
+            elif pages >= self.max_pages:
+                self._recycled += 1
+
+        if self._closed or not healthy or pages >= self.max_pages:
+            self._discard(driver)
+        else:
+            self._idle.put(driver)
+
+    def record_page(self, driver, count=1):
+        with self._lock:
+            self._pages[id(driver)] = self._pages.get(id(driver), 0) + count
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at
+            capacity = elapsed * self.size
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "created": self._created,
+                "recycled": self._recycled,
+                "crashed": self._crashed,
+                "leases": self._leases,
+                "utilization": self._busy_seconds / capacity if capacity else 0.0,
+                "avg_wait_seconds": (
+                    self._wait_seconds / self._leases if self._leases else 0.0
+                ),
+            }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,98 @@
+import logging
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from bs4.dammit import EncodingDetector
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Constants
+HTTP_TIMEOUT = 10
+HTTP_POOL_SIZE = 32
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+
+
+class HttpEngine:
+    """Keep-alive HTTP client for server-rendered pages.
+
+    One Session is shared by all worker threads so connections to the host are
+    pooled and reused instead of opening a browser per page.
+    """
+
+    name = "http"
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "User-Agent": USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml",
+                "Accept-Language": "en-US,en;q=0.9",
+            }
+        )
+        retries = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_html(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        if "charset" not in response.headers.get("Content-Type", "").lower():
+            # requests would fall back to ISO-8859-1 and turn "•" into "â€¢";
+            # use the page's own <meta charset>, else sniff the bytes
+            response.encoding = (
+                EncodingDetector.find_declared_encoding(response.content, is_html=True)
+                or response.apparent_encoding
+            )
+        return response.text
+
+    def get_soup(self, url):
+        return make_soup(self.get_html(url))
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def make_soup(html):
+    return BeautifulSoup(html, "lxml")
+
+
+def element_text(element):
+    # Mirrors WebElement.text closely enough for the fields we scrape
+    if element is None:
+        return None
+    return element.get_text(" ", strip=True)
+
+
+def absolute_href(element, base_url):
+    if element is None or not element.get("href"):
+        return None
+    return urljoin(base_url, element["href"])
+
+
+def fetch_soup(engine, url):
+    # Returns None when the HTTP engine cannot serve the page, so callers fall back to Selenium
+    try:
+        return engine.get_soup(url)
+    except requests.RequestException as e:
+        logging.warning(f"HTTP fetch failed for {url}: {e}")
+        return None
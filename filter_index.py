@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+# Sidebar option -> dashboard column holding the flag
+GRADE_COLUMNS = {
+    "Pre-K": "IsPreK",
+    "Elementary": "IsElementary",
+    "Middle": "IsMiddle",
+    "High": "IsHigh",
+}
+TYPE_COLUMNS = {
+    "Private": "Private",
+    "Public District": "Public District",
+    "Public Charter": "Public Charter",
+}
+NO_DATA_CATEGORY = "Data Not Available"
+
+
+def value_masks(series):
+    # One boolean array per distinct value, built from a single factorize pass
+    codes, uniques = pd.factorize(series)
+    return {value: codes == code for code, value in enumerate(uniques)}
+
+
+class FilterIndex:
+    """Precomputed boolean arrays for every sidebar filter value.
+
+    Arrays are positional over the frame the index was built from, so a filter
+    combination is a handful of NumPy ANDs/ORs followed by one df[mask].
+    """
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.cities = value_masks(df["City"])
+        self.categories = value_masks(df["Score Category"])
+        self.grades = {
+            label: df[column].to_numpy(dtype=bool)
+            for label, column in GRADE_COLUMNS.items()
+        }
+        self.types = {
+            label: df[column].to_numpy(dtype=bool)
+            for label, column in TYPE_COLUMNS.items()
+        }
+
+    def _none(self):
+        return np.zeros(self.size, dtype=bool)
+
+    def _any_of(self, masks, selected):
+        combined = self._none()
+        for value in selected:
+            if value in masks:
+                combined |= masks[value]
+        return combined
+
+    def mask(
+        self,
+        selected_cities,
+        selected_grades,
+        selected_school_types,
+        selected_score_category,
+        include_data_not_available,
+    ):
+        mask = np.ones(self.size, dtype=bool)
+
+        if "All" not in selected_cities:
+            mask &= self._any_of(self.cities, selected_cities)
+
+        if selected_score_category != "All":
+            mask &= self.categories.get(selected_score_category, self._none())
+
+        # An empty grade/type selection leaves that dimension unfiltered
+        if "All" not in selected_grades and selected_grades:
+            mask &= self._any_of(self.grades, selected_grades)
+
+        if "All" not in selected_school_types and selected_school_types:
+            mask &= self._any_of(self.types, selected_school_types)
+
+        if not include_data_not_available and NO_DATA_CATEGORY in self.categories:
+            mask &= ~self.categories[NO_DATA_CATEGORY]
+
+        return mask
@@ -0,0 +1,101 @@
+import re
+import time
+
+import pandas as pd
+
+from sqlite_store import SqliteStore
+
+# Constants
+GEOCODE_CACHE_PATH = "data/cache/geocode.sqlite3"
+NEGATIVE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+SCHEMA = """
+create table if not exists geocodes (
+    address_key text primary key,
+    latitude real,
+    longitude real,
+    cached_at real not null
+);
+"""
+
+
+def normalize_address(address):
+    # Case, punctuation and spacing differences should hit the same cache entry
+    if address is None or pd.isna(address):
+        return None
+    key = re.sub(r"[^\w\s]", " ", str(address).lower())
+    return re.sub(r"\s+", " ", key).strip() or None
+
+
+class GeocodeCache(SqliteStore):
+    """On-disk geocode results keyed by normalized address.
+
+    Misses are stored with null coordinates and only trusted for
+    `negative_ttl` seconds, after which the address is geocoded again.
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, negative_ttl=NEGATIVE_TTL_SECONDS):
+        super().__init__(path, SCHEMA)
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, address):
+        # Returns (lat, lon), (None, None) for a cached miss, or None if unknown
+        key = normalize_address(address)
+        if key is None:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "select latitude, longitude, cached_at from geocodes where address_key = ?",
+                (key,),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+            latitude, longitude, cached_at = row
+            if latitude is None:
+                if time.time() - cached_at > self.negative_ttl:
+                    self.misses += 1
+                    return None
+                self.negative_hits += 1
+                return (None, None)
+            self.hits += 1
+            return (latitude, longitude)
+
+    def put(self, address, coordinates):
+        key = normalize_address(address)
+        if key is None:
+            return
+        latitude, longitude = coordinates
+        with self._lock, self._conn:
+            self._conn.execute(
+                "insert or replace into geocodes values (?, ?, ?, ?)",
+                (key, latitude, longitude, time.time()),
+            )
+
+    def preload(self, df, address_column="Address", lat_column="lat", lon_column="lon"):
+        # Seed the cache from rows that were already geocoded, e.g. the staging CSV
+        known = df[[address_column, lat_column, lon_column]].dropna()
+        rows = [
+            (normalize_address(address), float(lat), float(lon), time.time())
+            for address, lat, lon in known.itertuples(index=False)
+        ]
+        rows = [row for row in rows if row[0] is not None]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "insert or ignore into geocodes values (?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+        }
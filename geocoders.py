@@ -0,0 +1,137 @@
+import re
+
+import pandas as pd
+from geopy.extra.rate_limiter import RateLimiter
+from geopy.geocoders import Nominatim
+
+import metrics
+
+# Every geocoder returns (lat, lon) for a match, (None, None) when the address
+# is known not to resolve, and None when it could not answer (an error, or an
+# address outside a local index) so the caller can try something else.
+
+STREET_SUFFIXES = {
+    "avenue": "ave",
+    "boulevard": "blvd",
+    "circle": "cir",
+    "court": "ct",
+    "drive": "dr",
+    "highway": "hwy",
+    "lane": "ln",
+    "parkway": "pkwy",
+    "place": "pl",
+    "road": "rd",
+    "street": "st",
+    "terrace": "ter",
+    "way": "wy",
+}
+DIRECTIONS = {"north": "n", "south": "s", "east": "e", "west": "w"}
+
+
+def address_key(address):
+    # "3909 Carpenter Ave., Los Angeles, CA, 91604" -> ("3909 carpenter ave", "91604")
+    if address is None or pd.isna(address):
+        return None
+    parts = [part.strip() for part in str(address).split(",")]
+    zips = re.findall(r"\b\d{5}\b", parts[-1]) if len(parts) > 1 else []
+    if not zips:
+        return None
+
+    words = re.sub(r"[^\w\s]", " ", parts[0].lower()).split()
+    words = [DIRECTIONS.get(word, STREET_SUFFIXES.get(word, word)) for word in words]
+    return " ".join(words), zips[0]
+
+
+class NominatimGeocoder:
+    """Remote geocoder, rate limited to Nominatim's one request per second."""
+
+    def __init__(self, user_agent="geo_encoding_schools", timeout=10):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self._geocode = None
+
+    def geocode(self, address):
+        if self._geocode is None:
+            geolocator = Nominatim(user_agent=self.user_agent, timeout=self.timeout)
+            self._geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
+        try:
+            location = self._geocode(address)
+            if location:
+                return (location.latitude, location.longitude)
+            else:
+                return (None, None)
+        except Exception as e:
+            print(f"Error geocoding {address}: {e}")
+            return None
+
+
+class LocalIndexGeocoder:
+    """Resolves addresses against an in-memory index of known coordinates.
+
+    Exact matches use the normalized street and ZIP. With `zip_centroids`
+    enabled, an unknown street falls back to the mean location of the ZIP.
+    """
+
+    def __init__(self, index, zip_centroids=None):
+        self.index = index
+        self.zip_centroids = zip_centroids or {}
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df,
+        address_column="Address",
+        lat_column="lat",
+        lon_column="lon",
+        zip_centroids=False,
+    ):
+        known = df[[address_column, lat_column, lon_column]].dropna()
+        known = known.assign(key=known[address_column].map(address_key))
+        known = known.dropna(subset=["key"])
+        coordinates = zip(
+            known[lat_column].astype(float), known[lon_column].astype(float)
+        )
+        index = dict(zip(known["key"], coordinates))
+
+        centroids = None
+        if zip_centroids:
+            means = (
+                known.assign(zip=known["key"].str[1])
+                .groupby("zip")[[lat_column, lon_column]]
+                .mean()
+            )
+            centroids = {
+                zip_code: (float(row[lat_column]), float(row[lon_column]))
+                for zip_code, row in means.iterrows()
+            }
+        return cls(index, centroids)
+
+    def geocode(self, address):
+        key = address_key(address)
+        if key is None:
+            return None
+        return self.index.get(key) or self.zip_centroids.get(key[1])
+
+
+class FallbackGeocoder:
+    """Tries each geocoder in order until one answers with coordinates."""
+
+    def __init__(self, *geocoders):
+        self.geocoders = geocoders
+
+    def geocode(self, address):
+        result = None
+        for geocoder in self.geocoders:
+            name = type(geocoder).__name__
+            with metrics.timer("geocoder_call_seconds", geocoder=name):
+                answer = geocoder.geocode(address)
+            if answer is None:
+                outcome = "error"
+            else:
+                outcome = "miss" if answer == (None, None) else "hit"
+            metrics.inc("geocoder_answers_total", geocoder=name, outcome=outcome)
+            if answer is not None and answer != (None, None):
+                return answer
+            # Remember a definite miss, but keep asking the remaining geocoders
+            result = answer if answer is not None else result
+        return result
@@ -0,0 +1,174 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from filter_index import GRADE_COLUMNS, NO_DATA_CATEGORY, TYPE_COLUMNS
+
+# Constants
+KPI_CACHE_SIZE = 256
+
+
+def flag_bits(df, columns):
+    # Pack boolean flag columns into one small integer per row
+    bits = np.zeros(len(df), dtype=np.int64)
+    for bit, column in enumerate(columns):
+        bits |= df[column].to_numpy(dtype=bool).astype(np.int64) << bit
+    return bits
+
+
+def selection_bits(selected, labels):
+    # Sidebar selection -> bitmask, None when the dimension is unfiltered
+    if "All" in selected or not selected:
+        return None
+    return sum(1 << bit for bit, label in enumerate(labels) if label in selected)
+
+
+class KpiEngine:
+    """KPI panel numbers answered from per-cell aggregates.
+
+    Schools are grouped once into (city, grade flags, type flags, score category)
+    cells holding count, score count, score sum, max score and the number of
+    schools at that max, so a filter combination only sums O(cells) values.
+    """
+
+    def __init__(self, df):
+        self.scores = df["Composite Score"].to_numpy(dtype=float)
+        self.category_values = df["Score Category"].to_numpy(dtype=object)
+
+        grade_bits = flag_bits(df, GRADE_COLUMNS.values())
+        type_bits = flag_bits(df, TYPE_COLUMNS.values())
+        cells = pd.DataFrame(
+            {
+                "city": df["City"].to_numpy(),
+                "grades": grade_bits,
+                "types": type_bits,
+                "category": self.category_values,
+                "score": self.scores,
+            }
+        )
+        # Schools at their cell's max score, for the "top performing" count
+        cell_max = cells.groupby(["city", "grades", "types", "category"], dropna=False)[
+            "score"
+        ].transform("max")
+        cells["at_max"] = cells["score"] == cell_max
+
+        grouped = cells.groupby(
+            ["city", "grades", "types", "category"], dropna=False, sort=False
+        ).agg(
+            schools=("score", "size"),
+            scored=("score", "count"),
+            score_sum=("score", "sum"),
+            score_max=("score", "max"),
+            at_max=("at_max", "sum"),
+        )
+        keys = grouped.index.to_frame(index=False)
+
+        self.cell_cities = keys["city"].to_numpy(dtype=object)
+        self.cell_grades = keys["grades"].to_numpy()
+        self.cell_types = keys["types"].to_numpy()
+        self.cell_categories = keys["category"].to_numpy(dtype=object)
+        self.cell_schools = grouped["schools"].to_numpy()
+        self.cell_scored = grouped["scored"].to_numpy()
+        self.cell_score_sum = grouped["score_sum"].to_numpy()
+        self.cell_score_max = grouped["score_max"].to_numpy()
+        self.cell_at_max = grouped["at_max"].to_numpy()
+
+        self._summary = lru_cache(maxsize=KPI_CACHE_SIZE)(self._summary_uncached)
+
+    def __len__(self):
+        return len(self.cell_schools)
+
+    def _cell_mask(
+        self,
+        selected_cities,
+        selected_grades,
+        selected_school_types,
+        selected_score_category,
+        include_data_not_available,
+    ):
+        # Same semantics as FilterIndex.mask, evaluated per cell instead of per row
+        mask = np.ones(len(self), dtype=bool)
+        if "All" not in selected_cities:
+            mask &= np.isin(self.cell_cities, list(selected_cities))
+        if selected_score_category != "All":
+            mask &= self.cell_categories == selected_score_category
+        grades = selection_bits(selected_grades, GRADE_COLUMNS)
+        if grades is not None:
+            mask &= (self.cell_grades & grades) != 0
+        types = selection_bits(selected_school_types, TYPE_COLUMNS)
+        if types is not None:
+            mask &= (self.cell_types & types) != 0
+        if not include_data_not_available:
+            mask &= self.cell_categories != NO_DATA_CATEGORY
+        return mask
+
+    def _summary_uncached(self, *filters):
+        cells = self._cell_mask(*filters)
+        schools_by_category = {}
+        for category, schools in zip(
+            self.cell_categories[cells], self.cell_schools[cells]
+        ):
+            schools_by_category[category] = schools_by_category.get(category, 0) + int(
+                schools
+            )
+
+        scored = self.cell_scored[cells].sum()
+        score_max = self.cell_score_max[cells]
+        top = 0
+        if scored:
+            best = np.nanmax(score_max)
+            top = int(self.cell_at_max[cells][score_max == best].sum())
+        return {
+            "average_composite_score": (
+                self.cell_score_sum[cells].sum() / scored if scored else np.nan
+            ),
+            "schools_by_category": schools_by_category,
+            "top_performing_schools": top,
+            "total_schools_with_scores": sum(
+                schools
+                for category, schools in schools_by_category.items()
+                if category != NO_DATA_CATEGORY
+            ),
+        }
+
+    def summary(
+        self,
+        selected_cities,
+        selected_grades,
+        selected_school_types,
+        selected_score_category,
+        include_data_not_available,
+    ):
+        # Selections are normalized to sorted tuples so they can key the cache
+        return self._summary(
+            tuple(sorted(selected_cities)),
+            tuple(sorted(selected_grades)),
+            tuple(sorted(selected_school_types)),
+            selected_score_category,
+            bool(include_data_not_available),
+        )
+
+    def summary_for(self, ids):
+        # Free-text search results don't line up with cells; aggregate the rows
+        scores = self.scores[ids]
+        categories, counts = np.unique(
+            self.category_values[ids].astype(str), return_counts=True
+        )
+        schools_by_category = dict(zip(categories, counts.astype(int).tolist()))
+        scored = ~np.isnan(scores)
+        top = 0
+        if scored.any():
+            top = int((scores == scores[scored].max()).sum())
+        return {
+            "average_composite_score": (
+                scores[scored].mean() if scored.any() else np.nan
+            ),
+            "schools_by_category": schools_by_category,
+            "top_performing_schools": top,
+            "total_schools_with_scores": sum(
+                schools
+                for category, schools in schools_by_category.items()
+                if category != NO_DATA_CATEGORY
+            ),
+        }
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from filter_index import NO_DATA_CATEGORY
+
+# Constants
+MIN_ZOOM = 6
+MAX_CLUSTER_ZOOM = 13  # from this zoom on, points are always drawn individually
+CLUSTER_PX = 60  # grid cell edge in screen pixels at the cluster zoom
+MAX_POINTS = 1500  # below this many schools in view, skip clustering
+MAP_WIDTH_PX = 1400
+MAP_HEIGHT_PX = 800
+TILE_PX = 256
+POINT_COLUMNS = [
+    "School Name",
+    "Address",
+    "Composite Score",
+    "Score Category",
+    "Academic Progress",
+    "Test Scores",
+    "School Types",
+    "lat",
+    "lon",
+]
+
+
+def degrees_per_pixel(zoom):
+    # Web Mercator: the world is TILE_PX * 2**zoom pixels wide
+    return 360.0 / (TILE_PX * 2**zoom)
+
+
+def viewport(center_lat, center_lon, zoom):
+    # (lat_min, lat_max, lon_min, lon_max) of a MAP_WIDTH_PX x MAP_HEIGHT_PX map
+    lon_half = degrees_per_pixel(zoom) * MAP_WIDTH_PX / 2
+    lat_half = (
+        degrees_per_pixel(zoom) * MAP_HEIGHT_PX / 2 * np.cos(np.radians(center_lat))
+    )
+    return (
+        center_lat - lat_half,
+        center_lat + lat_half,
+        center_lon - lon_half,
+        center_lon + lon_half,
+    )
+
+
+class MapLayer:
+    """Grid clusters over lat/lon, precomputed for every cluster zoom level.
+
+    Each level maps every school to a dense cell id once at load time, so a
+    rerun only bincounts the filtered ids into cells instead of shipping every
+    school to the browser.
+    """
+
+    def __init__(self, df):
+        self.lat = df["lat"].to_numpy(dtype=float)
+        self.lon = df["lon"].to_numpy(dtype=float)
+        self.scores = df["Composite Score"].to_numpy(dtype=float)
+        self.category_codes, self.categories = pd.factorize(
+            df["Score Category"], use_na_sentinel=False
+        )
+        self.points = df[POINT_COLUMNS].reset_index(drop=True)
+
+        self.cells = {}
+        for zoom in range(MIN_ZOOM, MAX_CLUSTER_ZOOM):
+            size = degrees_per_pixel(zoom) * CLUSTER_PX
+            keys = np.floor(self.lat / size).astype(np.int64) << 32
+            keys |= np.floor(self.lon / size).astype(np.int64) & 0xFFFFFFFF
+            _, cell_ids = np.unique(keys, return_inverse=True)
+            self.cells[zoom] = (cell_ids, int(cell_ids.max()) + 1 if len(keys) else 0)
+
+    def in_view(self, ids, center_lat, center_lon, zoom):
+        # Boolean mask over ids of the schools inside the map viewport
+        lat_min, lat_max, lon_min, lon_max = viewport(center_lat, center_lon, zoom)
+        lat, lon = self.lat[ids], self.lon[ids]
+        return (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+
+    def point_frame(self, ids, default_size):
+        points = self.points.iloc[ids]
+        sizes = np.where(np.isnan(self.scores[ids]), default_size, self.scores[ids])
+        return points, sizes
+
+    def cluster_frame(self, ids, zoom):
+        cell_ids, cell_count = self.cells[max(MIN_ZOOM, zoom)]
+        cells = cell_ids[ids]
+        counts = np.bincount(cells, minlength=cell_count)
+        occupied = np.flatnonzero(counts)
+        counts = counts[occupied]
+
+        lat = np.bincount(cells, self.lat[ids], cell_count)[occupied] / counts
+        lon = np.bincount(cells, self.lon[ids], cell_count)[occupied] / counts
+
+        scores = self.scores[ids]
+        scored = ~np.isnan(scores)
+        score_sum = np.bincount(cells[scored], scores[scored], cell_count)[occupied]
+        score_count = np.bincount(cells[scored], minlength=cell_count)[occupied]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            average = np.round(score_sum / score_count, 1)
+
+        # Majority score category per cell, from one (cell, category) bincount;
+        # unscored schools count half so mostly-unrated cells still show a score colour
+        n_categories = max(len(self.categories), 1)
+        by_category = np.bincount(
+            cells * n_categories + self.category_codes[ids],
+            minlength=cell_count * n_categories,
+        ).reshape(cell_count, n_categories)[occupied]
+        categories = np.asarray(self.categories)
+        weights = np.where(categories == NO_DATA_CATEGORY, 0.5, 1.0)
+        majority = categories[(by_category * weights).argmax(axis=1)]
+
+        return pd.DataFrame(
+            {
+                "Schools": counts,
+                "Average Composite Score": average,
+                "Score Category": majority,
+                "lat": lat,
+                "lon": lon,
+            }
+        )
+
+    def markers(self, ids, center_lat, center_lon, zoom, default_size=0.7):
+        """(points, sizes, clusters) to draw; points or clusters may be None.
+
+        Every filtered school is drawn, as a point or inside a cluster: the
+        server never learns where the user pans, so nothing may be cut away.
+        Schools in view become points when there are few enough of them (or
+        from MAX_CLUSTER_ZOOM on) and the rest are clustered.
+        """
+        if len(ids) <= MAX_POINTS:
+            points, sizes = self.point_frame(ids, default_size)
+            return points, sizes, None
+
+        visible = self.in_view(ids, center_lat, center_lon, zoom)
+        if zoom < MAX_CLUSTER_ZOOM and visible.sum() > MAX_POINTS:
+            return None, None, self.cluster_frame(ids, zoom)
+
+        points, sizes = self.point_frame(ids[visible], default_size)
+        clusters = None
+        if not visible.all():
+            cluster_zoom = min(zoom, MAX_CLUSTER_ZOOM - 1)
+            clusters = self.cluster_frame(ids[~visible], cluster_zoom)
+        return points, sizes, clusters
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Constants
+METRICS_PATH = "data/metrics"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_started = time.time()
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {
+                "buckets": [0] * (len(BUCKETS) + 1),
+                "count": 0,
+                "sum": 0.0,
+                "max": 0.0,
+            }
+        histogram["buckets"][bisect_left(BUCKETS, seconds)] += 1
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+        histogram["max"] = max(histogram["max"], seconds)
+
+
+@contextmanager
+def timer(name, **labels):
+    # Records the block's wall time, also when it raises
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def instrument_driver(driver):
+    # Every WebDriver command (get, find_element, execute_script, ...) goes
+    # through execute, so wrapping it counts and times each browser round trip
+    execute = driver.execute
+
+    def counted_execute(driver_command, params=None):
+        with timer("webdriver_command_seconds", command=driver_command):
+            return execute(driver_command, params)
+
+    driver.execute = counted_execute
+    return driver
+
+
+def quantile(histogram, q):
+    # Upper bound of the bucket holding the q-th observation
+    target = q * histogram["count"]
+    seen = 0
+    for bound, count in zip(BUCKETS, histogram["buckets"]):
+        seen += count
+        if seen >= target:
+            return min(bound, histogram["max"])
+    return histogram["max"]
+
+
+def _series(metric, labels):
+    if not labels:
+        return metric
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+    return f"{metric}{{{label_text}}}"
+
+
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {
+            key: dict(value, buckets=list(value["buckets"]))
+            for key, value in _histograms.items()
+        }
+    return counters, histograms
+
+
+def report():
+    counters, histograms = snapshot()
+    return {
+        "started_at": pd.Timestamp(_started, unit="s", tz="UTC").isoformat(),
+        "elapsed_seconds": round(time.time() - _started, 3),
+        "counters": [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(counters.items())
+        ],
+        "timers": [
+            {
+                "name": name,
+                "labels": dict(labels),
+                "count": histogram["count"],
+                "total_seconds": round(histogram["sum"], 6),
+                "mean_seconds": round(histogram["sum"] / histogram["count"], 6),
+                "p50_seconds": quantile(histogram, 0.5),
+                "p99_seconds": quantile(histogram, 0.99),
+                "max_seconds": round(histogram["max"], 6),
+            }
+            for (name, labels), histogram in sorted(histograms.items())
+        ],
+    }
+
+
+def prometheus_text():
+    counters, histograms = snapshot()
+    lines = []
+    typed = set()
+    for (name, labels), value in sorted(counters.items()):
+        metric = f"brightfutures_{name}"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{_series(metric, labels)} {value}")
+    for (name, labels), histogram in sorted(histograms.items()):
+        metric = f"brightfutures_{name}"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), histogram["buckets"]):
+            cumulative += count
+            bucket = _series(f"{metric}_bucket", labels + (("le", bound),))
+            lines.append(f"{bucket} {cumulative}")
+        lines.append(f"{_series(f'{metric}_sum', labels)} {histogram['sum']}")
+        lines.append(f"{_series(f'{metric}_count', labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(run_name, path=METRICS_PATH):
+    """Write <run_name>-<timestamp>.json and .prom under path, returning the JSON path."""
+    os.makedirs(path, exist_ok=True)
+    stamp = pd.Timestamp.now(tz="UTC").strftime("%Y%m%dT%H%M%S")
+    base = os.path.join(path, f"{run_name}-{stamp}")
+    with open(f"{base}.json", "w") as target:
+        json.dump(report(), target, indent=2)
+    with open(f"{base}.prom", "w") as target:
+        target.write(prometheus_text())
+    return f"{base}.json"
+
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _started = time.time()
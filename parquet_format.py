@@ -0,0 +1,138 @@
+import ast
+import re
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Constants
+RAW_CSV = "data/raw/raw_school_data.csv"
+STAGING_CSV = "data/staging/stg_all_schools.csv"
+RAW_PARQUET_PATH = "data/raw/raw_school_data"
+STAGING_PARQUET_PATH = "data/staging/stg_all_schools"
+
+# Column types by normalized (upper snake case) name, shared by the pipeline
+# tables and the display-named CSV exports
+FLOAT_COLUMNS = {
+    "GS_RATING",
+    "GSO_RATING",
+    "ACADEMIC_PROGRESS",
+    "TEST_SCORES",
+    "EQUITY_SCORES",
+    "STAR_RATING",
+    "NORMALIZED_TEST_SCORES",
+    "NORMALIZED_ACADEMIC_PROGRESS",
+    "NORMALIZED_EQUITY_SCORES",
+    "COMPOSITE_SCORE",
+    "LATITUDE",
+    "LONGITUDE",
+    "LAT",
+    "LON",
+}
+INTEGER_COLUMNS = {"REVIEW_COUNT"}
+BOOLEAN_COLUMNS = {
+    "IS_PREK",
+    "IS_ELEMENTARY",
+    "IS_MIDDLE",
+    "IS_HIGH",
+    "IS_PRIVATE",
+    "IS_PUBLIC_DISTRICT",
+    "IS_PUBLIC_CHARTER",
+    "ISPREK",
+    "ISELEMENTARY",
+    "ISMIDDLE",
+    "ISHIGH",
+    "PRIVATE",
+    "PUBLIC_DISTRICT",
+    "PUBLIC_CHARTER",
+}
+LIST_COLUMNS = {"SCHOOL_TYPES"}
+
+
+def normalized_name(column):
+    return re.sub(r"\W+", "_", column).strip("_").upper()
+
+
+def parse_school_types(value):
+    # Snowflake ARRAY columns arrive as JSON text, CSVs as repr strings, Parquet as arrays
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [str(item) for item in value]
+    if not isinstance(value, str):
+        return []
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return []
+    return [str(item) for item in parsed] if isinstance(parsed, (list, tuple)) else []
+
+
+def to_arrow_column(values, column):
+    name = normalized_name(column)
+    if name in FLOAT_COLUMNS or name in INTEGER_COLUMNS:
+        if values.dtype == object or pd.api.types.is_string_dtype(values):
+            values = values.astype("string").str.strip()
+        numbers = pd.to_numeric(values, errors="coerce")
+        if name in INTEGER_COLUMNS:
+            return pa.array(numbers.astype("Int32"), type=pa.int32())
+        return pa.array(numbers.astype("float32"), type=pa.float32(), from_pandas=True)
+    if name in BOOLEAN_COLUMNS:
+        return pa.array(values.fillna(False).astype(bool), type=pa.bool_())
+    if name in LIST_COLUMNS:
+        return pa.array(values.map(parse_school_types), type=pa.list_(pa.string()))
+    return pa.Array.from_pandas(values)
+
+
+def to_arrow_table(df):
+    return pa.table(
+        {column: to_arrow_column(df[column], column) for column in df.columns}
+    )
+
+
+def write_partitioned(df, root, partition_cols=(), replace=False):
+    # Hive-style directories like CITY=Irvine/BATCH_ID=...; by default new files are
+    # appended, with replace=True the partitions being written are rewritten
+    table = to_arrow_table(df)
+    partitioning = None
+    if partition_cols:
+        partitioning = ds.partitioning(
+            table.select(list(partition_cols)).schema, flavor="hive"
+        )
+    ds.write_dataset(
+        table,
+        root,
+        format="parquet",
+        partitioning=partitioning,
+        basename_template=f"part-{uuid4()}-{{i}}.parquet",
+        existing_data_behavior="delete_matching" if replace else "overwrite_or_ignore",
+    )
+
+
+def open_dataset(root):
+    return ds.dataset(root, format="parquet", partitioning="hive")
+
+
+def read_dataset(root, columns=None):
+    dataset = open_dataset(root)
+    if columns is not None:
+        columns = [column for column in columns if column in dataset.schema.names]
+    return dataset.to_table(columns=columns).to_pandas()
+
+
+def convert_csv(csv_path, root, partition_cols=("City",)):
+    df = pd.read_csv(csv_path)
+    write_partitioned(df, root, partition_cols, replace=True)
+    return len(df)
+
+
+def main():
+    # One-off conversion of the CSV snapshots checked into data/
+    conversions = [(RAW_CSV, RAW_PARQUET_PATH), (STAGING_CSV, STAGING_PARQUET_PATH)]
+    for csv_path, root in conversions:
+        rows = convert_csv(csv_path, root)
+        print(f"Converted {rows} rows from {csv_path} to {root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import hashlib
+import re
+
+from sqlite_store import SqliteStore
+
+# Constants
+REVIEW_HASH_PATH = "data/cache/review_hashes.sqlite3"
+REDIS_HASH_PREFIX = "brightfutures:reviews"
+REDIS_BATCH = 1000  # hashes per Redis round trip
+
+SCHEMA = """
+create table if not exists seen_reviews (
+    content_hash text primary key,
+    school_id text not null,
+    batch_id text not null
+);
+create table if not exists scraped_schools (
+    review_link text primary key,
+    fingerprint text not null,
+    batch_id text not null
+);
+create table if not exists loaded_pages (
+    page_key text primary key
+);
+"""
+
+
+def school_id(school_name, address):
+    # Same key as the dbt models: md5(school_name || '-' || address)
+    return hashlib.md5(f"{school_name}-{address}".encode("utf-8")).hexdigest()
+
+
+def normalize_review(text):
+    # Whitespace and case differences between crawls are the same review
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def content_hash(school_key, review_text):
+    payload = f"{school_key}\x1f{normalize_review(review_text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def add_content_hashes(df):
+    school_keys = [
+        school_id(name, address)
+        for name, address in zip(df["school_name"], df["address"])
+    ]
+    return df.assign(
+        school_id=school_keys,
+        content_hash=[
+            content_hash(key, text) for key, text in zip(school_keys, df["review_text"])
+        ],
+    )
+
+
+def preload_rows(df):
+    # (content_hash, school_id, batch_id) of warehouse reviews, one per hash
+    hashed = add_content_hashes(df)
+    batch_ids = hashed["batch_id"] if "batch_id" in hashed else ""
+    hashed = hashed.assign(batch_id=batch_ids).drop_duplicates("content_hash")
+    return hashed[["content_hash", "school_id", "batch_id"]].astype(str)
+
+
+class SeenReviews:
+    """new_reviews and stats on top of a hash store's known().
+
+    Subclasses start `new` and `duplicates` at 0.
+    """
+
+    def new_reviews(self, df):
+        # Returns df (with school_id and content_hash) reduced to unseen reviews
+        if df.empty:
+            return df
+        hashed = add_content_hashes(df).drop_duplicates("content_hash")
+        known = self.known(hashed["content_hash"])
+        fresh = hashed[~hashed["content_hash"].isin(known)]
+        self.duplicates += len(df) - len(fresh)
+        self.new += len(fresh)
+        return fresh
+
+    def stats(self):
+        return {"new": self.new, "duplicates": self.duplicates}
+
+
+class ReviewDedup(SeenReviews, SqliteStore):
+    """Content hashes of every review already loaded, kept across runs.
+
+    new_reviews drops repeats within a chunk and anything seen before;
+    mark_seen should only be called once those rows are in the warehouse.
+    It also keeps each school's listing fingerprint from its last review
+    scrape, which incremental refreshes compare the latest listing against,
+    and the listing pages a distributed crawl has loaded.
+    The file is in WAL mode, so it must stay on one host's local disk.
+    """
+
+    def __init__(self, path=REVIEW_HASH_PATH):
+        super().__init__(path, SCHEMA)
+        self.new = 0
+        self.duplicates = 0
+
+    def known(self, hashes):
+        rows = self.select_in(
+            "select content_hash from seen_reviews"
+            " where content_hash in ({placeholders})",
+            hashes,
+        )
+        return {row[0] for row in rows}
+
+    def mark_seen(self, df, batch_id):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "insert or ignore into seen_reviews values (?, ?, ?)",
+                [
+                    (key, school_key, batch_id)
+                    for key, school_key in zip(df["content_hash"], df["school_id"])
+                ],
+            )
+
+    def preload(self, df):
+        # Seed from reviews already in the warehouse (school_name, address, review_text)
+        df = df.rename(columns=str.lower)
+        if df.empty:
+            return 0
+        rows = preload_rows(df)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "insert or ignore into seen_reviews values (?, ?, ?)",
+                rows.itertuples(index=False, name=None),
+            )
+        return len(rows)
+
+    def scraped_fingerprints(self):
+        # Listing fingerprint of each school as of its last review scrape
+        with self._lock:
+            return dict(
+                self._conn.execute(
+                    "select review_link, fingerprint from scraped_schools"
+                ).fetchall()
+            )
+
+    def mark_scraped(self, fingerprints, batch_id):
+        # fingerprints: {review_link: fingerprint} for schools whose reviews loaded
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "insert or replace into scraped_schools values (?, ?, ?)",
+                [
+                    (link, str(fingerprint), batch_id)
+                    for link, fingerprint in fingerprints.items()
+                ],
+            )
+
+    def loaded_pages(self, keys):
+        rows = self.select_in(
+            "select page_key from loaded_pages where page_key in ({placeholders})",
+            keys,
+        )
+        return {row[0] for row in rows}
+
+    def mark_pages_loaded(self, keys):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "insert or ignore into loaded_pages values (?)",
+                [(key,) for key in keys],
+            )
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("select count(*) from seen_reviews").fetchone()[0]
+
+
+class RedisReviewDedup(SeenReviews):
+    """ReviewDedup on a Redis server, for crawl workers on several hosts.
+
+    Seen reviews are one hash of content_hash -> "school_id batch_id" and
+    fingerprints one hash of review_link -> fingerprint, and loaded listing
+    pages a set, so every call is a batch of single-key commands. Needs the optional `redis` package.
+    """
+
+    def __init__(self, url, prefix=REDIS_HASH_PREFIX):
+        import redis
+
+        self.url = url
+        self._seen = f"{prefix}:seen_reviews"
+        self._scraped = f"{prefix}:scraped_schools"
+        self._pages = f"{prefix}:loaded_pages"
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.new = 0
+        self.duplicates = 0
+
+    def known(self, hashes):
+        hashes = list(hashes)
+        found = set()
+        for start in range(0, len(hashes), REDIS_BATCH):
+            batch = hashes[start : start + REDIS_BATCH]
+            values = self._redis.hmget(self._seen, batch)
+            found.update(key for key, value in zip(batch, values) if value is not None)
+        return found
+
+    def _add_seen(self, rows):
+        # rows: (content_hash, school_id, batch_id); HSETNX keeps the first sighting
+        added = 0
+        pipe = self._redis.pipeline(transaction=False)
+        for count, (key, school_key, batch_id) in enumerate(rows, 1):
+            pipe.hsetnx(self._seen, key, f"{school_key} {batch_id}")
+            if count % REDIS_BATCH == 0:
+                added += sum(pipe.execute())
+        return added + sum(pipe.execute())
+
+    def mark_seen(self, df, batch_id):
+        self._add_seen(
+            (key, school_key, batch_id)
+            for key, school_key in zip(df["content_hash"], df["school_id"])
+        )
+
+    def preload(self, df):
+        # Seed from reviews already in the warehouse (school_name, address, review_text)
+        df = df.rename(columns=str.lower)
+        if df.empty:
+            return 0
+        rows = preload_rows(df)
+        self._add_seen(rows.itertuples(index=False, name=None))
+        return len(rows)
+
+    def scraped_fingerprints(self):
+        # Listing fingerprint of each school as of its last review scrape
+        return self._redis.hgetall(self._scraped)
+
+    def mark_scraped(self, fingerprints, batch_id):
+        # fingerprints: {review_link: fingerprint} for schools whose reviews loaded
+        if fingerprints:
+            self._redis.hset(
+                self._scraped,
+                mapping={
+                    link: str(fingerprint) for link, fingerprint in fingerprints.items()
+                },
+            )
+
+    def loaded_pages(self, keys):
+        keys = list(keys)
+        pipe = self._redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.sismember(self._pages, key)
+        return {key for key, loaded in zip(keys, pipe.execute()) if loaded}
+
+    def mark_pages_loaded(self, keys):
+        keys = list(keys)
+        if keys:
+            self._redis.sadd(self._pages, *keys)
+
+    def count(self):
+        return self._redis.hlen(self._seen)
+
+    def close(self):
+        self._redis.close()
@@ -0,0 +1,299 @@
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from textblob import TextBlob
+
+import metrics
+from review_dedup import content_hash, school_id
+from sqlite_store import SqliteStore
+from storage import get_storage
+
+# Constants
+SENTIMENT_CACHE_PATH = "data/cache/sentiment.sqlite3"
+SENTIMENT_BATCH_SIZE = 500  # reviews per worker task
+SENTIMENT_WORKERS = os.cpu_count() or 1
+POSITIVE_THRESHOLD = 0.1
+NEGATIVE_THRESHOLD = -0.1
+SOURCE_TABLE = "RAW.RAW_SCHOOL_REVIEW"
+TARGET_TABLE = "STAGING.REVIEWS_SENTIMENT_STAGE"
+TARGET_KEY_COLUMNS = ["SCHOOL_NAME", "ADDRESS", "REVIEW"]
+SCORE_COLUMNS = [
+    "processed_review",
+    "polarity",
+    "subjectivity",
+    "sentiment",
+    "highlights",
+    "positive_highlights",
+    "negative_highlights",
+]
+
+SCHEMA = """
+create table if not exists sentiment (
+    review_hash text primary key,
+    processed_review text not null,
+    polarity real not null,
+    subjectivity real not null,
+    sentiment text not null,
+    highlights text not null,
+    positive_highlights text not null,
+    negative_highlights text not null
+);
+create table if not exists staged_reviews (
+    content_hash text primary key
+);
+create table if not exists pending_stage (
+    content_hash text primary key
+);
+"""
+
+
+def process_review(text):
+    # Whitespace-only differences should hit the same cache entry
+    return re.sub(r"\s+", " ", str(text)).strip()
+
+
+def review_hash(text):
+    # Exact processed text, since processed_review is served back from the cache
+    return hashlib.sha1(process_review(text).encode("utf-8")).hexdigest()
+
+
+def staging_keys(df):
+    # Same review identity as the review loader's dedup (school + normalized text)
+    return [
+        content_hash(school_id(name, address), review)
+        for name, address, review in zip(
+            df["SCHOOL_NAME"], df["ADDRESS"], df["REVIEW_TEXT"]
+        )
+    ]
+
+
+def split_sentences(text):
+    # Regex split instead of TextBlob.sentences, which needs the NLTK punkt corpus
+    return [sentence for sentence in re.split(r"(?<=[.!?])\s+", text) if sentence]
+
+
+def classify(polarity):
+    if polarity > POSITIVE_THRESHOLD:
+        return "Positive"
+    if polarity < NEGATIVE_THRESHOLD:
+        return "Negative"
+    return "Neutral"
+
+
+def score_review(text):
+    processed = process_review(text)
+    sentiment = TextBlob(processed).sentiment
+    positive, negative = [], []
+    for sentence in split_sentences(processed):
+        polarity = TextBlob(sentence).sentiment.polarity
+        if polarity > POSITIVE_THRESHOLD:
+            positive.append(sentence)
+        elif polarity < NEGATIVE_THRESHOLD:
+            negative.append(sentence)
+    return (
+        processed,
+        sentiment.polarity,
+        sentiment.subjectivity,
+        classify(sentiment.polarity),
+        " ".join(positive + negative),
+        " ".join(positive),
+        " ".join(negative),
+    )
+
+
+def score_batch(texts):
+    # Runs in a worker process; one task per batch keeps pickling overhead low
+    return [score_review(text) for text in texts]
+
+
+class SentimentCache(SqliteStore):
+    """On-disk sentiment scores keyed by the hash of the processed review text,
+    plus the reviews already written to the stage table."""
+
+    def __init__(self, path=SENTIMENT_CACHE_PATH):
+        super().__init__(path, SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, hashes):
+        hashes = list(hashes)
+        rows = self.select_in(
+            "select * from sentiment where review_hash in ({placeholders})", hashes
+        )
+        found = {row[0]: row[1:] for row in rows}
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, scores):
+        # scores: {review_hash: score tuple}
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "insert or replace into sentiment values (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(key, *score) for key, score in scores.items()],
+            )
+
+    def staged(self, keys):
+        rows = self.select_in(
+            "select content_hash from staged_reviews"
+            " where content_hash in ({placeholders})",
+            keys,
+        )
+        return {row[0] for row in rows}
+
+    def mark_pending(self, keys):
+        # Recorded before the stage write, so a crash mid-write is seen next run
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "insert or ignore into pending_stage values (?)",
+                [(key,) for key in keys],
+            )
+
+    def pending(self):
+        with self._lock:
+            rows = self._conn.execute("select content_hash from pending_stage")
+            return {row[0] for row in rows}
+
+    def clear_pending(self):
+        with self._lock, self._conn:
+            self._conn.execute("delete from pending_stage")
+
+    def mark_staged(self, keys):
+        rows = [(key,) for key in keys]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "insert or ignore into staged_reviews values (?)", rows
+            )
+            self._conn.executemany(
+                "delete from pending_stage where content_hash = ?", rows
+            )
+
+    def staged_count(self):
+        with self._lock:
+            return self._conn.execute("select count(*) from staged_reviews").fetchone()[
+                0
+            ]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def score_reviews(texts, cache, executor=None, batch_size=SENTIMENT_BATCH_SIZE):
+    """Score columns (SCORE_COLUMNS) for texts, scoring each distinct unseen text once."""
+    texts = pd.Series(texts).fillna("").astype(str).reset_index(drop=True)
+    hashes = texts.map(review_hash)
+    unique = dict(zip(hashes, texts))
+
+    scores = cache.get_many(unique)
+    pending = [key for key in unique if key not in scores]
+    if pending:
+        batches = [
+            pending[start : start + batch_size]
+            for start in range(0, len(pending), batch_size)
+        ]
+        texts_by_batch = [[unique[key] for key in batch] for batch in batches]
+        results = (
+            executor.map(score_batch, texts_by_batch)
+            if executor is not None
+            else map(score_batch, texts_by_batch)
+        )
+        fresh = {}
+        for batch, batch_scores in zip(batches, results):
+            fresh.update(zip(batch, batch_scores))
+        cache.put_many(fresh)
+        scores.update(fresh)
+
+    return pd.DataFrame([scores[key] for key in hashes], columns=SCORE_COLUMNS)
+
+
+def build_sentiment_stage(df, cache, executor=None):
+    reviews = df.rename(columns=str.upper)
+    scored = score_reviews(reviews["REVIEW_TEXT"], cache, executor)
+    stage = pd.DataFrame(
+        {
+            "school_name": reviews["SCHOOL_NAME"].to_numpy(),
+            "address": reviews["ADDRESS"].to_numpy(),
+            "review": reviews["REVIEW_TEXT"].to_numpy(),
+        }
+    )
+    return pd.concat([stage, scored], axis=1)
+
+
+def unstaged_reviews(df, cache):
+    # Rows (with their staging key) not yet in the stage table, once each
+    reviews = df.rename(columns=str.upper)
+    reviews = reviews.assign(STAGING_KEY=staging_keys(reviews))
+    reviews = reviews.drop_duplicates("STAGING_KEY")
+    staged = cache.staged(reviews["STAGING_KEY"])
+    return reviews[~reviews["STAGING_KEY"].isin(staged)].reset_index(drop=True)
+
+
+def open_sentiment_cache(storage):
+    # First run against this cache: seed the staged set from the stage table.
+    # After an interrupted run: confirm the pending reviews that did land there.
+    cache = SentimentCache()
+    seed = not cache.staged_count()
+    pending = cache.pending()
+    if (seed or pending) and storage.has_table(TARGET_TABLE):
+        for chunk in storage.iter_chunks(TARGET_TABLE, columns=TARGET_KEY_COLUMNS):
+            chunk = chunk.rename(columns=str.upper).rename(
+                columns={"REVIEW": "REVIEW_TEXT"}
+            )
+            keys = staging_keys(chunk)
+            if not seed:
+                keys = [key for key in keys if key in pending]
+            cache.mark_staged(keys)
+    # Pending reviews not found in the stage table were never written
+    cache.clear_pending()
+    return cache
+
+
+def main():
+    storage = get_storage()
+    cache = open_sentiment_cache(storage)
+
+    total_rows = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=SENTIMENT_WORKERS) as executor:
+        # Only reviews not staged by an earlier run, so reviews_fact counts each once
+        for df in storage.iter_chunks(SOURCE_TABLE):
+            reviews = unstaged_reviews(df, cache)
+            metrics.inc("reviews_already_staged_total", len(df) - len(reviews))
+            if reviews.empty:
+                continue
+            with metrics.timer("sentiment_scoring_seconds"):
+                stage_df = build_sentiment_stage(reviews, cache, executor)
+            cache.mark_pending(reviews["STAGING_KEY"])
+            storage.write(stage_df, TARGET_TABLE)
+            cache.mark_staged(reviews["STAGING_KEY"])
+            metrics.inc("reviews_staged_total", len(stage_df))
+            total_rows += len(stage_df)
+            elapsed = time.perf_counter() - started
+            print(
+                f"Scored {total_rows} reviews into {TARGET_TABLE}"
+                f" ({total_rows / elapsed:.0f} reviews/sec)..."
+            )
+
+    cache_stats = cache.stats()
+    print(f"Sentiment cache stats: {cache_stats}")
+    for outcome in ("hits", "misses"):
+        metrics.inc(
+            "sentiment_cache_lookups_total", cache_stats[outcome], outcome=outcome
+        )
+    cache.close()
+    storage.close()
+    print(f"Metrics report: {metrics.write_report('sentiment')}")
+
+
+if __name__ == "__main__":
+    main()
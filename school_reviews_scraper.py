@@ -1,5 +1,5 @@
-from snowflake.snowpark.session import Session
-from uuid import uuid4
+import asyncio
+import aiohttp
 import pandas as pd
 from datetime import datetime
 import logging
@@ -7,152 +7,389 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import (
     NoSuchElementException,
     TimeoutException,
     StaleElementReferenceException,
 )
+from fetch_engine import HttpEngine, element_text, fetch_soup, make_soup
+from async_crawl import AsyncFetcher, HttpStatusError, run_units
+from driver_pool import DriverPool, resolve_driver_path
+from work_scheduler import IncompleteCrawlError, WorkStealingScheduler
+from checkpoint_store import CheckpointStore
+import metrics
+from browser_profile import LEAN_PROFILE, block_requests, lean_chrome_options
+from wait_engine import waits
+from review_dedup import ReviewDedup
+from storage import CHUNK_SIZE, get_storage
 
+# Constants
+FETCH_ENGINE = "http"  # "http" or "selenium"
+CRAWL_MODE = "parallel"  # "sequential", "parallel" or "async"
+REVIEW_WORKERS = 4
+INCREMENTAL_REFRESH = True
+FINGERPRINT_COLUMNS = ["GS_RATING", "STAR_RATING", "REVIEW_COUNT"]
+TARGET_COLUMNS = ["SCHOOL_NAME", "ADDRESS", "REVIEW_LINK", "BATCH_ID", "EXTRACTED_AT"]
+REVIEW_TABLE = "RAW.RAW_SCHOOL_REVIEW"
+REVIEW_HASH_COLUMNS = ["SCHOOL_NAME", "ADDRESS", "REVIEW_TEXT", "BATCH_ID"]
+BROWSER_FALLBACK_LIMIT = 2
+REVIEW_SELECTOR = "div.review-list-column div.five-star-review div.comment > span"
+MORE_LINK_SELECTOR = f"{REVIEW_SELECTOR} > span > a"
+NEXT_PAGE_SELECTOR = "a.anchor-button:not(.disabled)"
+EXPAND_REVIEWS_JS = """
+const links = document.querySelectorAll(arguments[0]);
+links.forEach((link) => link.click());
+return links.length;
+"""
+COLLAPSED_REVIEWS_JS = """
+return Array.from(document.querySelectorAll(arguments[0])).filter(
+    (link) => link.getAttribute("aria-expanded") !== "true" && link.offsetParent !== null
+).length;
+"""
 
-def snowpark_session_create():
-    connection_params = {
-        "account": "...",
-        "user": "...",
-        "password": "...!",
-        "role": "transform",
-        "warehouse": "...",
-        "database": "BRIGHTFUTURES",
-        "schema": "RAW",
-    }
-    session = Session.builder.configs(connection_params).create()
 
-    return session
+def init_review_driver(driver_path=None):
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    if LEAN_PROFILE:
+        # Stylesheets stay on: the "More" link check reads computed visibility
+        lean_chrome_options(chrome_options, block_stylesheets=False)
+    with metrics.timer("driver_startup_seconds", scraper="reviews"):
+        driver = webdriver.Chrome(
+            service=Service(driver_path or ChromeDriverManager().install()),
+            options=chrome_options,
+        )
+    if LEAN_PROFILE:
+        block_requests(driver, block_stylesheets=False)
+    return metrics.instrument_driver(driver)
 
 
 def get_reviews(review_link):
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    with webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()), options=chrome_options
-    ) as driver:
-        wait = WebDriverWait(driver, 10)
-        reviews = []
-        if not review_link.startswith("http"):
-            logging.info(f"Invalid review link: {review_link}")
-            return reviews
+    with init_review_driver() as driver:
+        return scrape_reviews(driver, review_link)
+
+
+def expand_reviews(driver):
+    # Click every "More" link in one script, then wait once for all of them
+    if driver.execute_script(EXPAND_REVIEWS_JS, MORE_LINK_SELECTOR):
+        waits.until(
+            driver,
+            "review_expand",
+            lambda driver: not driver.execute_script(
+                COLLAPSED_REVIEWS_JS, MORE_LINK_SELECTOR
+            ),
+        )
+
+
+def next_review_page_button(driver):
+    # End of pagination is read from the page: no enabled "next" chevron
+    next_page_buttons = driver.find_elements(By.CSS_SELECTOR, NEXT_PAGE_SELECTOR)
+    if next_page_buttons and "icon-chevron-right" in next_page_buttons[
+        -1
+    ].get_attribute("innerHTML"):
+        return next_page_buttons[-1]
+    return None
 
+
+def review_page_changed(previous_first_review):
+    # The list may be re-rendered in place, so compare content, not presence
+    def changed(driver):
+        elements = driver.find_elements(By.CSS_SELECTOR, REVIEW_SELECTOR)
+        if elements and elements[0].text != previous_first_review:
+            return elements
+        return False
+
+    return changed
+
+
+def scrape_reviews(driver, review_link):
+    reviews = []
+    if not review_link.startswith("http"):
+        logging.info(f"Invalid review link: {review_link}")
+        return reviews
+
+    with metrics.timer("page_load_seconds", engine="selenium", page="reviews"):
         driver.get(review_link)
 
-        while True:
-            # Try to find "More" links and click if available
-            try:
-                more_links = driver.find_elements(
-                    By.CSS_SELECTOR,
-                    "div.review-list-column div.five-star-review div.comment > span > span > a",
-                )
-                for link in more_links:
-                    try:
-                        wait.until(EC.element_to_be_clickable(link))
-                        driver.execute_script("arguments[0].click();", link)
-                        # Adding a short delay to ensure the page has time to render after clicking
-                        wait.until(
-                            lambda driver: link.get_attribute("aria-expanded") == "true"
-                            or not link.is_displayed(),
-                            "Failed to expand review content.",
-                        )
-                    except Exception as e:
-                        print(f"Error clicking a 'More' link: {e}")
-            except Exception as e:
-                print(f"Error finding 'More' links: {e}")
-
-            # Extract the review texts
-            try:
-                review_elements = driver.find_elements(
-                    By.CSS_SELECTOR,
-                    "div.review-list-column div.five-star-review div.comment > span",
-                )
-                reviews = [
-                    element.text for element in review_elements if element.text != ""
-                ]
-            except Exception as e:
-                print(f"Error extracting reviews: {e}")
-
-            # Attempt to go to the next page
-            try:
-                next_page_buttons = driver.find_elements(
-                    By.CSS_SELECTOR, "a.anchor-button:not(.disabled)"
-                )
-                if next_page_buttons and "icon-chevron-right" in next_page_buttons[
-                    -1
-                ].get_attribute("innerHTML"):
-                    next_button = next_page_buttons[-1]
-                    driver.execute_script(
-                        "arguments[0].scrollIntoView(true);", next_button
-                    )
-                    driver.execute_script("arguments[0].click();", next_button)
-                    # Wait for a condition that indicates the page has loaded.
-                    wait.until(
-                        EC.presence_of_element_located(
-                            (By.CSS_SELECTOR, "div.review-list-column")
-                        )
-                    )
-                else:
-                    print("No more pages to navigate.")
-                    break
-            except (NoSuchElementException, TimeoutException):
-                print("No more pages or timed out waiting for page to load.")
+    while True:
+        try:
+            expand_reviews(driver)
+        except Exception as e:
+            print(f"Error expanding reviews: {e}")
+
+        # Extract the review texts
+        first_review = None
+        try:
+            review_texts = [
+                element.text
+                for element in driver.find_elements(By.CSS_SELECTOR, REVIEW_SELECTOR)
+            ]
+            first_review = review_texts[0] if review_texts else None
+            # Accumulate across pages; each page only shows its own reviews
+            reviews.extend(text for text in review_texts if text != "")
+        except Exception as e:
+            print(f"Error extracting reviews: {e}")
+
+        # Attempt to go to the next page
+        try:
+            next_button = next_review_page_button(driver)
+            if next_button is None:
+                print("No more pages to navigate.")
                 break
+            driver.execute_script("arguments[0].scrollIntoView(true);", next_button)
+            driver.execute_script("arguments[0].click();", next_button)
+            waits.until(driver, "reviews", review_page_changed(first_review))
+            metrics.inc("review_pages_total", engine="selenium")
+        except (NoSuchElementException, TimeoutException):
+            print("No more pages or timed out waiting for page to load.")
+            break
 
-        return reviews
+    return reviews
+
+
+def get_reviews_http(engine, review_link):
+    # Returns None when the page needs a browser (truncated reviews or a JS pager)
+    with metrics.timer("page_load_seconds", engine="http", page="reviews"):
+        soup = fetch_soup(engine, review_link)
+    if soup is None:
+        metrics.inc("browser_fallbacks_total", page="reviews", reason="fetch_failed")
+        return None
+    reviews = parse_reviews(soup)
+    if reviews is None:
+        metrics.inc("browser_fallbacks_total", page="reviews", reason="needs_js")
+    else:
+        metrics.inc("review_pages_total", engine="http")
+    return reviews
+
+
+def parse_reviews(soup):
+    if soup.select(MORE_LINK_SELECTOR):
+        return None
+
+    next_page_buttons = soup.select(NEXT_PAGE_SELECTOR)
+    if next_page_buttons and "icon-chevron-right" in str(next_page_buttons[-1]):
+        return None
+
+    reviews = []
+    for element in soup.select(REVIEW_SELECTOR):
+        text = element_text(element)
+        if text:
+            reviews.append(text)
+    return reviews
+
+
+def fetch_reviews(review_link, engine=None, pool=None):
+    if engine is not None and review_link.startswith("http"):
+        reviews = get_reviews_http(engine, review_link)
+        if reviews is not None:
+            return reviews
+
+    # Fall back to the browser for pages that need JS
+    if pool is None:
+        return get_reviews(review_link)
+    with pool.lease() as driver:
+        reviews = scrape_reviews(driver, review_link)
+        pool.record_page(driver)
+    return reviews
 
 
-def load_data_to_snowflake(session, df, table_name):
-    # Convert Pandas DataFrame to Snowpark DataFrame
-    sp_df = session.create_dataframe(df)
+def harvest_reviews(rows, workers=REVIEW_WORKERS, engine=None):
+    # Yields (row, reviews) per school as soon as each one finishes
+    def driver_factory():
+        return init_review_driver(resolve_driver_path())
 
-    # Write the Snowpark DataFrame to a Snowflake table
-    sp_df.write.save_as_table(table_name, mode="append", table_type="temporary")
+    def handle(row, submit):
+        return fetch_reviews(row["REVIEW_LINK"], engine, pool)
+
+    scheduler = WorkStealingScheduler(workers)
+    with DriverPool(driver_factory, size=workers) as pool:
+        yield from scheduler.run(rows, handle)
+        logging.info(f"Review driver pool stats: {pool.stats()}")
+
+
+async def fetch_reviews_async(fetcher, review_link, browser_slots):
+    if review_link.startswith("http"):
+        try:
+            reviews = parse_reviews(make_soup(await fetcher.get_html(review_link)))
+            if reviews is not None:
+                return reviews
+        except (aiohttp.ClientError, asyncio.TimeoutError, HttpStatusError) as e:
+            logging.warning(f"Async fetch failed for {review_link}: {e}")
+
+    # Only a few browsers at a time, in threads so the event loop keeps fetching
+    async with browser_slots:
+        return await asyncio.to_thread(get_reviews, review_link)
+
+
+async def harvest_reviews_async(rows, on_result):
+    browser_slots = asyncio.Semaphore(BROWSER_FALLBACK_LIMIT)
+
+    async with AsyncFetcher() as fetcher:
+
+        async def handle(row, submit):
+            individual_reviews = await fetch_reviews_async(
+                fetcher, row["REVIEW_LINK"], browser_slots
+            )
+            on_result(row, individual_reviews)
+
+        await run_units(rows, handle)
+        logging.info(f"Async fetcher stats: {fetcher.stats()}")
+
+
+def add_fingerprints(df):
+    # Batches from before REVIEW_COUNT was scraped fingerprint it as missing
+    fingerprints = df.reindex(columns=FINGERPRINT_COLUMNS).astype(str)
+    df = df.assign(FINGERPRINT=pd.util.hash_pandas_object(fingerprints, index=False))
+    return df.drop(columns=[c for c in FINGERPRINT_COLUMNS if c in df.columns])
+
+
+def load_review_targets(storage):
+    # Stream only the columns we need and fold each chunk into the latest listing
+    # row per school, so memory stays flat however many crawls have accumulated
+    latest = None
+    for chunk in storage.iter_chunks(
+        "RAW_SCHOOL_INFO", columns=TARGET_COLUMNS + FINGERPRINT_COLUMNS
+    ):
+        chunk = add_fingerprints(chunk.dropna(subset=["REVIEW_LINK"]))
+        if latest is not None:
+            chunk = pd.concat([latest, chunk], ignore_index=True)
+        latest = chunk.sort_values("EXTRACTED_AT", kind="stable").drop_duplicates(
+            subset=["REVIEW_LINK"], keep="last"
+        )
+    if latest is None:
+        return pd.DataFrame(columns=TARGET_COLUMNS + ["FINGERPRINT"])
+    return latest
+
+
+def select_changed_schools(schools, scraped_fingerprints):
+    # Compare each school's latest listing card with the one seen when its reviews
+    # were last scraped; keep schools never scraped or whose rating/review count moved
+    scraped = schools["REVIEW_LINK"].map(scraped_fingerprints)
+    changed = schools[schools["FINGERPRINT"].astype(str) != scraped]
+    logging.info(
+        f"Incremental refresh: {len(changed)} of {len(schools)} schools changed"
+    )
+    return changed
+
+
+def scrape_review_rows(rows, on_result):
+    if CRAWL_MODE == "async":
+        asyncio.run(harvest_reviews_async(rows, on_result))
+        return
+
+    engine = HttpEngine(pool_size=REVIEW_WORKERS) if FETCH_ENGINE == "http" else None
+
+    if CRAWL_MODE == "parallel":
+        results = harvest_reviews(rows, REVIEW_WORKERS, engine)
+    else:
+        results = ((row, fetch_reviews(row["REVIEW_LINK"], engine)) for row in rows)
+    try:
+        for row, individual_reviews in results:
+            on_result(row, individual_reviews)
+    finally:
+        if engine is not None:
+            engine.close()
+
+
+def build_review_rows(row, individual_reviews, batch_id, extract_timestamp):
+    return [
+        {
+            "school_name": row["SCHOOL_NAME"],
+            "address": row["ADDRESS"],
+            "review_text": review,
+            "batch_id": batch_id,
+            "extracted_at": extract_timestamp,
+        }
+        for review in individual_reviews
+    ]
+
+
+def open_review_dedup(storage, dedup=None):
+    # First run against this store: seed the seen-set from reviews already loaded
+    if dedup is None:
+        dedup = ReviewDedup()
+    if not dedup.count() and storage.has_table(REVIEW_TABLE):
+        for chunk in storage.iter_chunks(REVIEW_TABLE, columns=REVIEW_HASH_COLUMNS):
+            dedup.preload(chunk)
+    return dedup
 
 
 def main():
-    # Start snowpark session
-    session = snowpark_session_create()
-
-    # Call the table, make it a pandas dataframe
-    df = session.table("RAW_SCHOOL_INFO").to_pandas()
-    df = df.dropna(subset=["REVIEW_LINK"])
-
-    batch_id = str(uuid4())
-    extract_timestamp = pd.Timestamp.now(tz="UTC")
-
-    review_data = []
-
-    for _, row in df.iterrows():
-        review_link = row["REVIEW_LINK"]
-        school_name = row["SCHOOL_NAME"]
-        address = row["ADDRESS"]
-        individual_reviews = get_reviews(review_link)
-
-        for review in individual_reviews:
-            review_data.append(
-                {
-                    "school_name": school_name,
-                    "address": address,
-                    "review_text": review,
-                    "batch_id": batch_id,
-                    "extracted_at": extract_timestamp,
-                }
+    # Shared warehouse storage (one pooled session per process)
+    storage = get_storage()
+    dedup = open_review_dedup(storage)
+
+    # Every school once, or only the ones whose listing card changed
+    schools = load_review_targets(storage)
+    if INCREMENTAL_REFRESH:
+        schools = select_changed_schools(schools, dedup.scraped_fingerprints())
+
+    # Resume the unfinished run if there is one, skipping schools already scraped
+    store = CheckpointStore()
+    batch_id, extract_timestamp = store.start_run("reviews")
+    completed = store.completed_reviews(batch_id)
+    rows = [
+        row
+        for row in schools.to_dict("records")
+        if not completed.get(row["REVIEW_LINK"], {}).get("loaded")
+    ]
+
+    # Scrape and load one chunk of schools at a time so reviews never pile up in memory
+    for start in range(0, len(rows), CHUNK_SIZE):
+        review_data = []
+        pending_rows = []
+        for row in rows[start : start + CHUNK_SIZE]:
+            checkpoint = completed.get(row["REVIEW_LINK"])
+            if checkpoint is not None:
+                review_data.extend(
+                    build_review_rows(
+                        row, checkpoint["reviews"], batch_id, extract_timestamp
+                    )
+                )
+            else:
+                pending_rows.append(row)
+
+        def collect(row, individual_reviews):
+            store.save_reviews(batch_id, row["REVIEW_LINK"], individual_reviews)
+            review_data.extend(
+                build_review_rows(row, individual_reviews, batch_id, extract_timestamp)
             )
 
-    reviews_df = pd.DataFrame(review_data)
+        try:
+            scrape_review_rows(pending_rows, collect)
+        except IncompleteCrawlError:
+            # Scraped schools are checkpointed; leave the run open so the next
+            # run resumes this batch and retries only the failed ones
+            logging.error(f"Review crawl incomplete, batch {batch_id} left open")
+            store.close()
+            raise
+
+        # Only reviews never loaded before go to the warehouse
+        reviews_df = dedup.new_reviews(pd.DataFrame(review_data))
+        if not reviews_df.empty:
+            storage.write(
+                reviews_df.drop(columns=["school_id", "content_hash"]), REVIEW_TABLE
+            )
+            dedup.mark_seen(reviews_df, batch_id)
+        chunk_rows = rows[start : start + CHUNK_SIZE]
+        store.mark_reviews_loaded(batch_id, [row["REVIEW_LINK"] for row in chunk_rows])
+        # Later incremental runs compare the listing against these fingerprints
+        dedup.mark_scraped(
+            {row["REVIEW_LINK"]: row["FINGERPRINT"] for row in chunk_rows}, batch_id
+        )
 
-    load_data_to_snowflake(session, reviews_df, "RAW_SCHOOL_REVIEW")
+    store.finish_run(batch_id)
+    store.close()
+    logging.info(f"Review dedup stats: {dedup.stats()}")
+    logging.info(f"Adaptive wait stats: {waits.stats()}")
+    dedup.close()
+    metrics.inc("reviews_loaded_total", dedup.new)
+    metrics.inc("reviews_duplicate_total", dedup.duplicates)
 
     # Make sure to close session
-    session.close()
+    storage.close()
+    logging.info(f"Metrics report: {metrics.write_report('reviews')}")
 
 
 if __name__ == "__main__":
@@ -1,21 +1,26 @@
+import asyncio
 import logging
+import re
+import aiohttp
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.common.exceptions import NoSuchElementException
 from webdriver_manager.chrome import ChromeDriverManager
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import snowflake.connector
-from snowflake.connector.pandas_tools import write_pandas
-from snowflake.snowpark.session import Session
+from functools import partial
 import os
-from dotenv import load_dotenv
-from uuid import uuid4
+import metrics
+from browser_profile import LEAN_PROFILE, block_requests, lean_chrome_options
+from wait_engine import waits
+from fetch_engine import HttpEngine, absolute_href, element_text, fetch_soup, make_soup
+from async_crawl import AsyncFetcher, HttpStatusError, run_units
+from driver_pool import DriverPool, PAGES_PER_DRIVER, resolve_driver_path
+from checkpoint_store import CheckpointStore
+from storage import get_storage
+from work_scheduler import CrawlUnit, IncompleteCrawlError, WorkStealingScheduler
 
 # Setup logging
 logging.basicConfig(
@@ -24,11 +29,77 @@ logging.basicConfig(
 
 # Constants
 HEADLESS_MODE = True
-TIMEOUT = 10
 MAX_WORKERS = 4
-
-
-def init_driver(headless=True):
+FAST_EXTRACTION = True
+FETCH_ENGINE = "http"  # "http" or "selenium"
+HTTP_WORKERS = 16
+CRAWL_MODE = "threads"  # "threads" or "async"
+# Result-count text GreatSchools shows when a city/grade has no schools
+EMPTY_LISTING_PATTERN = r"\b(no schools found|0 schools)\b"
+LISTING_PAGE_SIZE = 25  # cards on every listing page but the last
+
+# One round trip per wait poll: the card count and pager once the cards are
+# in and the pager has had a chance to render, {cards: 0} for an empty
+# listing, or null while the page is still loading
+LISTING_STATE_JS = """
+if (document.readyState === "loading") {
+    return null;
+}
+const cards = document.querySelectorAll("li.school-card").length;
+const pages = Array.from(document.querySelectorAll("a[href*='page=']")).map(
+    (link) => link.href
+);
+const hasNext = document.querySelector("a.next_page") !== null;
+const pager = pages.length > 0 || hasNext;
+if (cards) {
+    // A full page is only done without a pager once the document has loaded
+    if (pager || cards < arguments[1] || document.readyState === "complete") {
+        return {cards: cards, pages: pages, has_next: hasNext, pager: pager};
+    }
+    return null;
+}
+if (new RegExp(arguments[0], "i").test(document.body.innerText)) {
+    return {cards: 0};
+}
+return null;
+"""
+
+# Same selectors as extract_school_data, evaluated in the browser in one call
+EXTRACT_CARDS_JS = """
+const text = (root, selector) => {
+    const el = root.querySelector(selector);
+    return el ? el.innerText.trim() : null;
+};
+return Array.from(document.querySelectorAll("li.school-card")).map((card) => {
+    const address = text(card, ".address");
+    const gsRating = text(card, ".gs-rating .circle-rating--search-page");
+    const subratings = {};
+    card.querySelectorAll(".subratings .subrating").forEach((subrating) => {
+        const name = text(subrating, ".name");
+        if (name !== null) {
+            subratings[name] = text(subrating, ".circle-rating--xx-small");
+        }
+    });
+    const reviewLink = card.querySelector("a[href*='/reviews/']");
+    const schoolLink = card.querySelector("div.header > a");
+    return {
+        name: text(card, "a.name"),
+        address: address === null ? null : address.split("\u2022")[0].trim(),
+        gs_rating: gsRating === null ? null : gsRating.split("/")[0],
+        subratings: subratings,
+        school_types: Array.from(
+            card.querySelectorAll(".filter-chips .filter-chip")
+        ).map((chip) => chip.innerText.trim()),
+        star_rating: text(card, ".user-rating .five-stars .rating-value"),
+        review_link: reviewLink ? reviewLink.href : null,
+        review_count: reviewLink ? reviewLink.innerText.trim() : null,
+        school_link: schoolLink ? schoolLink.href : null,
+    };
+});
+"""
+
+
+def init_driver(headless=True, driver_path=None):
     options = Options()
     if headless:
         options.add_argument("--headless")
@@ -36,47 +107,194 @@ def init_driver(headless=True):
     options.add_argument("--disable-extensions")  # Disable extensions
     options.add_argument("--no-sandbox")  # Bypass OS security model
     options.add_argument("--disable-dev-shm-usage")
+    if LEAN_PROFILE:
+        # Stylesheets stay on: card extraction reads innerText, which follows
+        # CSS visibility and layout
+        lean_chrome_options(options, block_stylesheets=False)
+
+    service = Service(driver_path or ChromeDriverManager().install())
+    with metrics.timer("driver_startup_seconds", scraper="schools"):
+        driver = webdriver.Chrome(service=service, options=options)
+    if LEAN_PROFILE:
+        block_requests(driver, block_stylesheets=False)
+    return metrics.instrument_driver(driver)
+
+
+def build_listing_url(city, grade_key, page=1):
+    url = f"https://www.greatschools.org/california/{city.lower().replace(' ', '-')}/schools/?gradeLevels={grade_key}"
+    if page > 1:
+        url += f"&page={page}"
+    return url
+
+
+def find_last_page(hrefs):
+    # Numbered pagination links carry the page in their href
+    pages = [1]
+    for href in hrefs:
+        match = re.search(r"[?&]page=(\d+)", href or "")
+        if match:
+            pages.append(int(match.group(1)))
+    return max(pages)
+
+
+def listing_conditions():
+    # ready and finished for waits.until; finished reads the state ready just
+    # fetched, so each poll is one execute_script
+    state = {}
+
+    def ready(driver):
+        state["page"] = driver.execute_script(
+            LISTING_STATE_JS, EMPTY_LISTING_PATTERN, LISTING_PAGE_SIZE
+        )
+        return state["page"] if state["page"] and state["page"]["cards"] else False
+
+    def finished(driver):
+        return bool(state.get("page")) and not state["page"]["cards"]
+
+    return ready, finished
+
+
+def read_listing_page(driver, url, city, batch_id, load_timestamp):
+    with metrics.timer("page_load_seconds", engine="selenium", page="listing"):
+        driver.get(url)
+    ready, finished = listing_conditions()
+    listing = waits.until(driver, "listing", ready, finished)
+    if listing is None:
+        metrics.inc("empty_listing_pages_total")
+        return [], 1, False
+    with metrics.timer("card_extraction_seconds", engine="selenium"):
+        if FAST_EXTRACTION:
+            schools_list = extract_school_cards(driver, city, batch_id, load_timestamp)
+        else:
+            schools_list = []
+            school_cards = driver.find_elements(By.CSS_SELECTOR, "li.school-card")
+            for school in school_cards:
+                school_data = extract_school_data(
+                    school, city, batch_id, load_timestamp
+                )
+                schools_list.append(school_data)
+    metrics.inc("listing_pages_total", engine="selenium")
+    metrics.inc("school_cards_total", len(schools_list), engine="selenium")
+
+    last_page = find_last_page(listing["pages"])
+    has_next = listing["has_next"]
+    if not listing["pager"] and listing["cards"] >= LISTING_PAGE_SIZE:
+        # A full page with no pager at all: more pages are unknown, not absent,
+        # so probe the next one (an empty page ends the chain)
+        metrics.inc("listing_pager_missing_total")
+        has_next = True
+    return schools_list, last_page, has_next
+
+
+def read_listing_page_http(engine, url, city, batch_id, load_timestamp):
+    with metrics.timer("page_load_seconds", engine="http", page="listing"):
+        soup = fetch_soup(engine, url)
+    if soup is None:
+        metrics.inc("browser_fallbacks_total", page="listing", reason="fetch_failed")
+        return None
+    with metrics.timer("card_extraction_seconds", engine="http"):
+        page = parse_listing_page(soup, url, city, batch_id, load_timestamp)
+    if page is None:
+        metrics.inc("browser_fallbacks_total", page="listing", reason="no_cards")
+        return None
+    metrics.inc("listing_pages_total", engine="http")
+    metrics.inc("school_cards_total", len(page[0]), engine="http")
+    return page
+
+
+def parse_listing_page(soup, url, city, batch_id, load_timestamp):
+    school_cards = soup.select("li.school-card")
+    if not school_cards:
+        # Cards were not server-rendered, let the browser handle this page
+        return None
+
+    schools_list = [
+        parse_school_card(school, url, city, batch_id, load_timestamp)
+        for school in school_cards
+    ]
+    last_page = find_last_page(
+        link.get("href") for link in soup.select("a[href*='page=']")
+    )
+    has_next = soup.select_one("a.next_page") is not None
+    return schools_list, last_page, has_next
+
+
+def read_listing_page_browser(pool, url, city, batch_id, load_timestamp):
+    with pool.lease() as driver:
+        page = read_listing_page(driver, url, city, batch_id, load_timestamp)
+        pool.record_page(driver)
+    return page
+
+
+def load_checkpoint(store, unit, batch_id, load_timestamp):
+    if store is None:
+        return None
+    page = store.load_listing_page(batch_id, unit)
+    if page is not None:
+        for school_data in page[0]:
+            school_data["extracted_at"] = load_timestamp
+    return page
+
+
+def crawl_unit(unit, submit, pool, engine, batch_id, load_timestamp, store=None):
+    page = load_checkpoint(store, unit, batch_id, load_timestamp)
+    if page is not None:
+        return fan_out_pages(unit, submit, page)
+
+    url = build_listing_url(unit.city, unit.grade, unit.page)
+    if engine is not None:
+        page = read_listing_page_http(engine, url, unit.city, batch_id, load_timestamp)
+    if page is None:
+        page = read_listing_page_browser(pool, url, unit.city, batch_id, load_timestamp)
+
+    if store is not None:
+        store.save_listing_page(batch_id, unit, page)
+    return fan_out_pages(unit, submit, page)
+
+
+async def crawl_unit_async(
+    unit, submit, fetcher, pool, batch_id, load_timestamp, store=None
+):
+    page = load_checkpoint(store, unit, batch_id, load_timestamp)
+    if page is not None:
+        return fan_out_pages(unit, submit, page)
+
+    url = build_listing_url(unit.city, unit.grade, unit.page)
+    try:
+        soup = make_soup(await fetcher.get_html(url))
+        page = parse_listing_page(soup, url, unit.city, batch_id, load_timestamp)
+    except (aiohttp.ClientError, asyncio.TimeoutError, HttpStatusError) as e:
+        logging.warning(f"Async fetch failed for {url}: {e}")
+    if page is None:
+        # Browser fallback runs in a thread so it doesn't block the event loop
+        page = await asyncio.to_thread(
+            read_listing_page_browser, pool, url, unit.city, batch_id, load_timestamp
+        )
 
-    service = Service(ChromeDriverManager().install())
-    return webdriver.Chrome(service=service, options=options)
+    if store is not None:
+        store.save_listing_page(batch_id, unit, page)
+    return fan_out_pages(unit, submit, page)
 
 
-def get_school_data_for_city(city, grades, batch_id, load_timestamp):
-    driver = init_driver(HEADLESS_MODE)
-    all_schools_list = []
+def fan_out_pages(unit, submit, page):
+    schools_list, last_page, has_next = page
 
-    try:
-        for grade_key, grade_name in grades.items():
-            url = f"https://www.greatschools.org/california/{city.lower().replace(' ', '-')}/schools/?gradeLevels={grade_key}"
-            driver.get(url)
-
-            while True:
-                WebDriverWait(driver, TIMEOUT).until(
-                    EC.presence_of_all_elements_located(
-                        (By.CSS_SELECTOR, "li.school-card")
-                    )
-                )
-                school_cards = driver.find_elements(By.CSS_SELECTOR, "li.school-card")
-                for school in school_cards:
-                    school_data = extract_school_data(
-                        school, city, batch_id, load_timestamp
-                    )
-                    all_schools_list.append(school_data)
-
-                # Check if a next page is available
-                try:
-                    next_button = WebDriverWait(driver, TIMEOUT).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, "a.next_page"))
-                    )
-                    driver.execute_script("arguments[0].click();", next_button)
-                except TimeoutException:
-                    # No next page, break the loop
-                    break
+    # Page 1 and the chained frontier page extend the crawl; every other page
+    # was already handed out by one of them
+    if unit.page != 1 and not unit.chained:
+        return schools_list
 
-    finally:
-        driver.quit()
+    if last_page > unit.page:
+        # Fan out the linked pages so other workers can pick them up; the last
+        # one becomes the new frontier, since pagination may only show a window
+        for page_number in range(unit.page + 1, last_page):
+            submit(CrawlUnit(unit.city, unit.grade, page_number))
+        submit(CrawlUnit(unit.city, unit.grade, last_page, chained=True))
+    elif has_next:
+        # No further page links, discover pages one at a time instead
+        submit(CrawlUnit(unit.city, unit.grade, unit.page + 1, chained=True))
 
-    return all_schools_list
+    return schools_list
 
 
 def extract_school_data(school, city, batch_id, load_timestamp):
@@ -133,8 +351,10 @@ def extract_school_data(school, city, batch_id, load_timestamp):
             By.XPATH, ".//a[contains(@href, '/reviews/')]"
         )
         review_link = review_link_element.get_attribute("href")
+        review_count = review_link_element.text
     except NoSuchElementException:
         review_link = None
+        review_count = None
 
     # Extract the school link
     try:
@@ -144,18 +364,92 @@ def extract_school_data(school, city, batch_id, load_timestamp):
     except NoSuchElementException:
         school_link = None
 
+    return build_school_record(
+        {
+            "name": name,
+            "address": address,
+            "gs_rating": gso_rating,
+            "subratings": subratings,
+            "school_types": school_types,
+            "star_rating": star_rating,
+            "review_link": review_link,
+            "review_count": review_count,
+            "school_link": school_link,
+        },
+        city,
+        batch_id,
+        load_timestamp,
+    )
+
+
+def extract_school_cards(driver, city, batch_id, load_timestamp):
+    # One WebDriver round-trip for the whole page instead of ~10 per card
+    cards = driver.execute_script(EXTRACT_CARDS_JS) or []
+    return [build_school_record(card, city, batch_id, load_timestamp) for card in cards]
+
+
+def parse_school_card(school, base_url, city, batch_id, load_timestamp):
+    # Same selectors as extract_school_data, applied to server-rendered HTML
+    address = element_text(school.select_one(".address"))
+    gso_rating = element_text(
+        school.select_one(".gs-rating .circle-rating--search-page")
+    )
+
+    review_link = school.select_one("a[href*='/reviews/']")
+
+    subratings = {}
+    for subrating in school.select(".subratings .subrating"):
+        subrating_name = element_text(subrating.select_one(".name"))
+        if subrating_name is not None:
+            subratings[subrating_name] = element_text(
+                subrating.select_one(".circle-rating--xx-small")
+            )
+
+    return build_school_record(
+        {
+            "name": element_text(school.select_one("a.name")),
+            "address": address.split("•")[0].strip() if address else None,
+            "gs_rating": gso_rating.split("/")[0].strip() if gso_rating else None,
+            "subratings": subratings,
+            "school_types": [
+                element_text(chip)
+                for chip in school.select(".filter-chips .filter-chip")
+            ],
+            "star_rating": element_text(
+                school.select_one(".user-rating .five-stars .rating-value")
+            ),
+            "review_link": absolute_href(review_link, base_url),
+            "review_count": element_text(review_link),
+            "school_link": absolute_href(school.select_one("div.header > a"), base_url),
+        },
+        city,
+        batch_id,
+        load_timestamp,
+    )
+
+
+def parse_review_count(text):
+    # The review link reads like "12 reviews"; keep just the number
+    match = re.search(r"\d[\d,]*", text or "")
+    return int(match.group().replace(",", "")) if match else None
+
+
+def build_school_record(card, city, batch_id, load_timestamp):
+    subratings = card.get("subratings") or {}
+
     # Prepare the school data dictionary
     school_data = {
-        "school_name": name,
-        "address": address,
-        "gs_rating": gso_rating,
+        "school_name": card["name"],
+        "address": card.get("address"),
+        "gs_rating": card.get("gs_rating"),
         "academic_progress": subratings.get("Academic Progress", None),
         "test_scores": subratings.get("Test Scores", None),
         "equity_scores": subratings.get("Equity", None),
-        "school_types": school_types,
-        "star_rating": star_rating,
-        "review_link": review_link,
-        "school_link": school_link,
+        "school_types": card.get("school_types") or [],
+        "star_rating": card.get("star_rating"),
+        "review_link": card.get("review_link"),
+        "review_count": parse_review_count(card.get("review_count")),
+        "school_link": card.get("school_link"),
         "city": city,
         "batch_id": batch_id,
         "extracted_at": load_timestamp,
@@ -164,33 +458,57 @@ def extract_school_data(school, city, batch_id, load_timestamp):
     return school_data
 
 
-def snowpark_session_create():
-    connection_params = {
-        "account": "<account_id>",
-        "user": "<user_created_in_snowflake>",
-        "password": "<password_for_user>",
-        "role": "transform",
-        "warehouse": "<your_warehouse>",
-        "database": "<your database>",
-        "schema": "<target schema>",
-    }
-    session = Session.builder.configs(connection_params).create()
-    return session
-
-
-def load_data_to_snowflake(session, df, table_name):
-    # Convert Pandas DataFrame to Snowpark DataFrame
-    sp_df = session.create_dataframe(df)
-
-    # Write the Snowpark DataFrame to a Snowflake table
-    sp_df.write.save_as_table(table_name, mode="append", table_type="temporary")
+def crawl_threaded(units, pool, batch_id, load_timestamp, store=None):
+    if FETCH_ENGINE == "http":
+        engine = HttpEngine(pool_size=HTTP_WORKERS)
+        workers = HTTP_WORKERS
+    else:
+        engine = None
+        workers = MAX_WORKERS
+
+    scheduler = WorkStealingScheduler(workers)
+    handler = partial(
+        crawl_unit,
+        pool=pool,
+        engine=engine,
+        batch_id=batch_id,
+        load_timestamp=load_timestamp,
+        store=store,
+    )
+
+    all_schools_data = []
+    try:
+        # Collect results as units finish
+        for unit, schools_list in scheduler.run(units, handler):
+            all_schools_data.extend(schools_list)
+    finally:
+        if engine is not None:
+            engine.close()
+    return all_schools_data
+
+
+async def crawl_async(units, pool, batch_id, load_timestamp, store=None):
+    all_schools_data = []
+    async with AsyncFetcher() as fetcher:
+        handler = partial(
+            crawl_unit_async,
+            fetcher=fetcher,
+            pool=pool,
+            batch_id=batch_id,
+            load_timestamp=load_timestamp,
+            store=store,
+        )
+        for unit, schools_list in await run_units(units, handler):
+            all_schools_data.extend(schools_list)
+        logging.info(f"Async fetcher stats: {fetcher.stats()}")
+    return all_schools_data
 
 
 def main():
-    session = snowpark_session_create()
-    # Generate a unique batch ID and current timestamp
-    batch_id = str(uuid4())
-    load_timestamp = pd.Timestamp.now(tz="UTC")
+    storage = get_storage()
+    # Resume the unfinished run if there is one, otherwise start a new batch
+    store = CheckpointStore()
+    batch_id, load_timestamp = store.start_run("schools")
 
     # with open('cities.txt') as file:
     #     cities = file.read()
@@ -200,27 +518,46 @@ def main():
     cities = ["Irvine"]
     grades = {"e": "Elementary", "m": "Middle", "h": "High"}
 
-    # Use ThreadPoolExecutor to parallelize data collection
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Submit tasks
-        futures = {
-            executor.submit(
-                get_school_data_for_city, city, grades, batch_id, load_timestamp
-            ): city
-            for city in cities
-        }
+    # Browsers are only started for pages the HTTP engine cannot serve
+    def driver_factory():
+        return init_driver(HEADLESS_MODE, resolve_driver_path())
 
-        all_schools_data = []
-        # Collect results
-        for future in as_completed(futures):
-            all_schools_data.extend(future.result())
+    # Split the crawl into (city, grade, page) units so large cities spread across workers
+    units = [CrawlUnit(city, grade_key) for city in cities for grade_key in grades]
+
+    with DriverPool(
+        driver_factory, size=MAX_WORKERS, max_pages=PAGES_PER_DRIVER
+    ) as pool:
+        try:
+            if CRAWL_MODE == "async":
+                all_schools_data = asyncio.run(
+                    crawl_async(units, pool, batch_id, load_timestamp, store)
+                )
+            else:
+                all_schools_data = crawl_threaded(
+                    units, pool, batch_id, load_timestamp, store
+                )
+        except IncompleteCrawlError:
+            # Nothing is loaded and the run stays open; finished pages are
+            # checkpointed, so the next run resumes and retries only the rest
+            logging.error(f"Crawl incomplete, batch {batch_id} left open to resume")
+            store.close()
+            raise
+
+        logging.info(f"Driver pool stats: {pool.stats()}")
+        logging.info(f"Adaptive wait stats: {waits.stats()}")
 
     # Construct DataFrame from collected data
     df = pd.DataFrame(all_schools_data)
 
-    # Save the DataFrame to Snowflake
+    # Save the DataFrame to the warehouse
     table_name = "RAW_SCHOOL_INFO"
-    load_data_to_snowflake(session, df, table_name)
+    storage.write(df, table_name)
+
+    store.finish_run(batch_id)
+    store.close()
+    storage.close()
+    logging.info(f"Metrics report: {metrics.write_report('schools')}")
 
 
 if __name__ == "__main__":
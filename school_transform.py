@@ -1,48 +1,104 @@
+import os
+import numpy as np
 import pandas as pd
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
-import ast
-from snowflake.snowpark.session import Session
+import metrics
+from geocode_cache import GeocodeCache
+from geocoders import FallbackGeocoder, LocalIndexGeocoder, NominatimGeocoder
+from storage import get_storage
+from parquet_format import parse_school_types
+
+# Constants
+STAGING_CSV = "data/staging/stg_all_schools.csv"
+SCHOOL_TYPE_FLAGS = {
+    "Pre-K": "is_prek",
+    "Elementary school": "is_elementary",
+    "Middle school": "is_middle",
+    "High school": "is_high",
+    "Private": "is_private",
+    "Public district": "is_public_district",
+    "Public charter": "is_public_charter",
+}
+SCORE_BINS = [-np.inf, 4, 6, np.inf]
+SCORE_LABELS = ["Below Average", "Average", "Above Average"]
+NO_SCORE_LABEL = "Data Not Available"
+NORMALIZED_COLUMNS = {
+    "TEST_SCORES": "Normalized Test Scores",
+    "ACADEMIC_PROGRESS": "Normalized Academic Progress",
+    "EQUITY_SCORES": "Normalized Equity Scores",
+}
 
 
 # Helper functions
-def categorize_score(score):
-    if pd.isna(score):
-        return "Data Not Available"
-    elif score <= 4:
-        return "Below Average"
-    elif 5 <= score <= 6:
-        return "Average"
-    else:
-        return "Above Average"
-
-
-def preprocess_and_geoencode(df):
-    df["is_prek"] = df["SCHOOL_TYPES"].apply(lambda x: "Pre-K" in x)
-    df["is_elementary"] = df["SCHOOL_TYPES"].apply(lambda x: "Elementary school" in x)
-    df["is_middle"] = df["SCHOOL_TYPES"].apply(lambda x: "Middle school" in x)
-    df["is_high"] = df["SCHOOL_TYPES"].apply(lambda x: "High school" in x)
-    df["Score Category"] = df["GS_RATING"].apply(categorize_score)
-
-    geolocator = Nominatim(user_agent="geo_encoding_schools", timeout=10)
-    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
-
-    def geocode_address(address):
-        try:
-            location = geocode(address)
-            if location:
-                return (location.latitude, location.longitude)
-            else:
-                return (None, None)
-        except Exception as e:
-            print(f"Error geocoding {address}: {e}")
-            return (None, None)
+def school_type_matrix(school_types):
+    # Parse each distinct SCHOOL_TYPES value once and broadcast it back to the rows
+    hashable = school_types.map(
+        lambda x: tuple(x) if isinstance(x, (list, np.ndarray)) else x
+    )
+    codes, uniques = pd.factorize(hashable)
+    matrix = np.zeros((len(uniques) + 1, len(SCHOOL_TYPE_FLAGS)), dtype=bool)
+    for row, value in enumerate(uniques):
+        chips = set(parse_school_types(value))
+        matrix[row] = [chip in chips for chip in SCHOOL_TYPE_FLAGS]
+    # The extra all-False row is picked up by missing values (code -1)
+    return matrix[codes]
+
+
+def add_school_type_flags(df):
+    matrix = school_type_matrix(df["SCHOOL_TYPES"])
+    flags = pd.DataFrame(
+        matrix, columns=list(SCHOOL_TYPE_FLAGS.values()), index=df.index
+    )
+    return df.assign(**flags)
+
+
+def add_scores(df):
+    rating = pd.to_numeric(df["GS_RATING"], errors="coerce")
+    score_category = pd.cut(rating, bins=SCORE_BINS, labels=SCORE_LABELS)
+    columns = {
+        "Score Category": score_category.cat.add_categories(NO_SCORE_LABEL)
+        .fillna(NO_SCORE_LABEL)
+        .astype(str)
+    }
+
+    for source, target in NORMALIZED_COLUMNS.items():
+        columns[target] = pd.to_numeric(df[source], errors="coerce") / 10
+
+    # Rescale the mean normalized subrating onto 1-10
+    normalized = pd.DataFrame(
+        {target: columns[target] for target in NORMALIZED_COLUMNS.values()}
+    )
+    columns["Composite Score"] = (1 + 9 * normalized.mean(axis=1)).round()
+
+    return df.assign(**columns)
+
+
+def geocode_addresses(addresses, cache=None, geocoder=None):
+    if geocoder is None:
+        geocoder = NominatimGeocoder()
 
     #  Geocode addresses and ensure the list for DataFrame creation doesn't include NoneType objects
     coordinates_list = []
-    for address in df["ADDRESS"]:
-        result = geocode_address(address)
-        coordinates_list.append(result if result != (None, None) else (pd.NA, pd.NA))
+    for address in addresses:
+        result = cache.get(address) if cache is not None else None
+        if result is None:
+            with metrics.timer("geocode_seconds", geocoder=type(geocoder).__name__):
+                result = geocoder.geocode(address)
+            metrics.inc("geocode_calls_total", geocoder=type(geocoder).__name__)
+            # Failed lookups are retried next run, only real misses are cached
+            if result is not None and cache is not None:
+                cache.put(address, result)
+        if result is None or result == (None, None):
+            coordinates_list.append((pd.NA, pd.NA))
+        else:
+            coordinates_list.append(result)
+    return coordinates_list
+
+
+def preprocess_and_geoencode(df, cache=None, geocoder=None):
+    df = add_school_type_flags(df)
+    df = add_scores(df)
+
+    coordinates_list = geocode_addresses(df["ADDRESS"], cache, geocoder)
 
     # Create Latitude and Longitude columns from the coordinates list
     df[["Latitude", "Longitude"]] = pd.DataFrame(coordinates_list, index=df.index)
@@ -52,41 +108,42 @@ def preprocess_and_geoencode(df):
     return df.drop(["BATCH_ID", "EXTRACTED_AT"], axis=1)
 
 
-def snowpark_session_create():
-    connection_params = {
-        "account": "...",
-        "user": "...",
-        "password": "...",
-        "role": "transform",
-        "warehouse": "...",
-        "database": "BRIGHTFUTURES",
-        "schema": "STAGING",
-    }
-    session = Session.builder.configs(connection_params).create()
-    return session
-
-
-def load_data_to_snowflake(session, df, table_name):
-    # Convert Pandas DataFrame to Snowpark DataFrame
-    sp_df = session.create_dataframe(df)
-
-    # Write the Snowpark DataFrame to a Snowflake table
-    sp_df.write.save_as_table(table_name, mode="append", table_type="temporary")
-
-
 def main():
-    session = snowpark_session_create()
-    df = session.table("RAW.RAW_SCHOOL_INFO").to_pandas()  # Get the RAW data
-    processed_df = preprocess_and_geoencode(df)
+    storage = get_storage()
+
+    # Seed the geocode cache and the local index with coordinates we already have
+    cache = GeocodeCache()
+    geocoder = NominatimGeocoder()
+    if os.path.exists(STAGING_CSV):
+        staging = pd.read_csv(STAGING_CSV, usecols=["Address", "lat", "lon"])
+        cache.preload(staging)
+        # Only addresses missing from the local index go out to Nominatim
+        geocoder = FallbackGeocoder(
+            LocalIndexGeocoder.from_dataframe(staging), geocoder
+        )
 
     # Specify the target table within the STAGING schema
     table_name = "STAGING.STG_SCHOOL_INFO"
-    session.create_dataframe(processed_df).write.mode("append").save_as_table(
-        table_name
-    )
+
+    # Stream the RAW data in fixed-size chunks so memory stays flat as it grows
+    total_rows = 0
+    for df in storage.iter_chunks("RAW.RAW_SCHOOL_INFO"):
+        processed_df = preprocess_and_geoencode(df, cache, geocoder)
+        storage.write(processed_df, table_name)
+        total_rows += len(processed_df)
+        print(f"Loaded {total_rows} rows into {table_name}...")
+
+    print(f"Geocode cache stats: {cache.stats()}")
+    cache_stats = cache.stats()
+    for outcome in ("hits", "negative_hits", "misses"):
+        metrics.inc(
+            "geocode_cache_lookups_total", cache_stats[outcome], outcome=outcome
+        )
+    cache.close()
 
     print(f"Data successfully loaded into {table_name}.")
-    session.close()
+    storage.close()
+    print(f"Metrics report: {metrics.write_report('transform')}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+
+# Constants
+GRAM_SIZE = 3
+FUZZY_THRESHOLD = 0.5
+QUERY_CACHE_SIZE = 1024
+
+# Rank buckets, best first
+NAME_PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(4)
+
+
+def grams(text, size=GRAM_SIZE):
+    return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+
+def words(text):
+    return re.findall(r"\w+", text)
+
+
+class SearchIndex:
+    """Trigram index over school names and addresses, plus a sorted word list
+    for prefix lookups.
+
+    Results are positional ids into the frame the index was built from, ranked
+    name prefix > word prefix > any other substring, shorter names first.
+    """
+
+    def __init__(self, names, addresses=None):
+        self.names = np.array([str(name).lower() for name in names], dtype=str)
+        if addresses is None:
+            addresses = [""] * len(self.names)
+        self.addresses = np.array(
+            [
+                str(address).lower() if address == address else ""
+                for address in addresses
+            ],
+            dtype=str,
+        )
+        self.docs = np.char.add(np.char.add(self.names, " | "), self.addresses)
+        self.name_lengths = np.char.str_len(self.names)
+
+        postings = defaultdict(list)
+        tokens = []
+        for doc_id, (doc, name) in enumerate(zip(self.docs, self.names)):
+            for gram in grams(doc):
+                postings[gram].append(doc_id)
+            tokens.extend((word, doc_id) for word in set(words(name)))
+        self.postings = {
+            gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()
+        }
+
+        tokens.sort()
+        self.tokens = np.array([token for token, _ in tokens], dtype=str)
+        self.token_docs = np.array([doc_id for _, doc_id in tokens], dtype=np.int32)
+
+        self._search = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._search_uncached)
+
+    def __len__(self):
+        return len(self.names)
+
+    def prefix(self, query):
+        # Documents with a name word starting with query
+        start = np.searchsorted(self.tokens, query, side="left")
+        end = np.searchsorted(self.tokens, query + "￿", side="left")
+        return np.unique(self.token_docs[start:end])
+
+    def substring(self, query):
+        query_grams = grams(query)
+        if not query_grams:
+            # Too short for trigrams; a plain scan is cheap at this size
+            return np.flatnonzero(np.char.find(self.docs, query) >= 0).astype(np.int32)
+
+        lists = sorted(
+            (
+                self.postings.get(gram, np.empty(0, dtype=np.int32))
+                for gram in query_grams
+            ),
+            key=len,
+        )
+        candidates = lists[0]
+        for ids in lists[1:]:
+            if not len(candidates):
+                break
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+
+        if len(query) > GRAM_SIZE and len(candidates):
+            # Shared trigrams don't guarantee a contiguous match
+            candidates = candidates[np.char.find(self.docs[candidates], query) >= 0]
+        return candidates
+
+    def fuzzy(self, query, threshold=FUZZY_THRESHOLD):
+        # Documents sharing at least `threshold` of the query's trigrams
+        query_grams = grams(query)
+        if not query_grams:
+            return np.empty(0, dtype=np.int32)
+        counts = np.zeros(len(self.names), dtype=np.int32)
+        for gram in query_grams:
+            ids = self.postings.get(gram)
+            if ids is not None:
+                counts[ids] += 1
+        return np.flatnonzero(counts >= max(1, int(threshold * len(query_grams))))
+
+    def _rank(self, ids, query):
+        rank = np.full(len(ids), SUBSTRING, dtype=np.int8)
+        rank[np.isin(ids, self.prefix(query.split()[0]), assume_unique=True)] = (
+            WORD_PREFIX
+        )
+        rank[np.char.startswith(self.names[ids], query)] = NAME_PREFIX
+        return rank
+
+    def _search_uncached(self, query, fuzzy):
+        ids = self.substring(query)
+        if not len(ids) and fuzzy:
+            ids = self.fuzzy(query)
+            rank = np.full(len(ids), FUZZY, dtype=np.int8)
+        else:
+            rank = self._rank(ids, query)
+        # Best bucket first, then shorter (more specific) names
+        order = np.lexsort((self.name_lengths[ids], rank))
+        ranked = ids[order]
+        ranked.setflags(write=False)
+        return ranked
+
+    def search(self, query, fuzzy=False, limit=None):
+        query = " ".join(query.lower().split())
+        if not query:
+            return np.arange(len(self.names))[:limit]
+        return self._search(query, fuzzy)[:limit]
+
+    def mask(self, query, fuzzy=False):
+        mask = np.zeros(len(self.names), dtype=bool)
+        mask[self.search(query, fuzzy)] = True
+        return mask
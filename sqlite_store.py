@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import threading
+
+# Constants
+SQLITE_MAX_PARAMS = 900  # stay under SQLite's bound-parameter limit
+
+
+class SqliteStore:
+    """One SQLite file in WAL mode, shared by a process's threads.
+
+    Base of the on-disk caches and checkpoints: the connection is opened once
+    with the schema applied, and every statement runs under self._lock.
+    WAL needs shared memory, so a store file must live on a local disk.
+    """
+
+    def __init__(self, path, schema, synchronous=None, **connect_args):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, **connect_args)
+        self._conn.execute("pragma journal_mode=wal")
+        if synchronous is not None:
+            self._conn.execute(f"pragma synchronous={synchronous}")
+        self._conn.executescript(schema)
+
+    def select_in(self, sql, values):
+        # sql holds one "{placeholders}" for an IN list; values are bound in chunks
+        values = list(values)
+        rows = []
+        with self._lock:
+            for start in range(0, len(values), SQLITE_MAX_PARAMS):
+                batch = values[start : start + SQLITE_MAX_PARAMS]
+                placeholders = ", ".join("?" * len(batch))
+                rows.extend(
+                    self._conn.execute(
+                        sql.format(placeholders=placeholders), batch
+                    ).fetchall()
+                )
+        return rows
+
+    def close(self):
+        self._conn.close()
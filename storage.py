@@ -0,0 +1,181 @@
+import os
+import threading
+
+import pandas as pd
+from dotenv import load_dotenv
+
+import metrics
+from parquet_format import normalized_name, open_dataset, write_partitioned
+
+load_dotenv()
+
+# Constants
+CHUNK_SIZE = 5000
+STORAGE_BACKEND = os.getenv("BRIGHTFUTURES_STORAGE", "snowflake")  # or "local"
+LOCAL_WAREHOUSE_PATH = os.getenv("BRIGHTFUTURES_WAREHOUSE", "data/warehouse")
+DEFAULT_SCHEMA = "RAW"
+TABLE_PARTITIONS = {
+    "RAW_SCHOOL_INFO": ["CITY", "BATCH_ID"],
+    "RAW_SCHOOL_REVIEW": ["BATCH_ID"],
+    "STG_SCHOOL_INFO": ["CITY"],
+}
+
+_session = None
+_session_lock = threading.Lock()
+_storage = None
+
+
+def snowflake_connection_params():
+    return {
+        "account": os.getenv("SNOWFLAKE_ACCOUNT"),
+        "user": os.getenv("SNOWFLAKE_USER"),
+        "password": os.getenv("SNOWFLAKE_PASSWORD"),
+        "role": os.getenv("SNOWFLAKE_ROLE", "transform"),
+        "warehouse": os.getenv("SNOWFLAKE_WAREHOUSE"),
+        "database": os.getenv("SNOWFLAKE_DATABASE", "BRIGHTFUTURES"),
+        "schema": os.getenv("SNOWFLAKE_SCHEMA", DEFAULT_SCHEMA),
+    }
+
+
+def get_session():
+    # One Snowpark session per process, shared by every stage that needs it
+    global _session
+    with _session_lock:
+        if _session is None:
+            from snowflake.snowpark.session import Session
+
+            _session = Session.builder.configs(snowflake_connection_params()).create()
+        return _session
+
+
+def normalize_columns(df):
+    # "Score Category" -> SCORE_CATEGORY, school_name -> SCHOOL_NAME, as Snowflake stores them
+    return df.rename(columns=normalized_name)
+
+
+def split_table_name(table_name):
+    schema, _, table = table_name.upper().rpartition(".")
+    return schema or None, table
+
+
+def iter_table_chunks(session, table_name, chunk_size=CHUNK_SIZE, columns=None):
+    # to_pandas_batches streams result partitions of whatever size the warehouse
+    # returns; re-slice them so callers always work on at most chunk_size rows
+    table = session.table(table_name)
+    if columns is not None:
+        table = table.select([column for column in columns if column in table.columns])
+
+    pending = []
+    pending_rows = 0
+    for batch in table.to_pandas_batches():
+        pending.append(batch)
+        pending_rows += len(batch)
+        while pending_rows >= chunk_size:
+            combined = pd.concat(pending, ignore_index=True)
+            yield combined.iloc[:chunk_size]
+            rest = combined.iloc[chunk_size:]
+            pending = [rest]
+            pending_rows = len(rest)
+
+    if pending_rows:
+        yield pd.concat(pending, ignore_index=True)
+
+
+class SnowflakeStorage:
+    """Warehouse backend that bulk loads through write_pandas (staged Parquet + COPY)."""
+
+    name = "snowflake"
+
+    def __init__(self, session=None):
+        self.session = session or get_session()
+
+    def write(self, df, table_name):
+        schema, table = split_table_name(table_name)
+        with metrics.timer("warehouse_load_seconds", backend=self.name, table=table):
+            self.session.write_pandas(
+                normalize_columns(df),
+                table,
+                schema=schema,
+                auto_create_table=True,
+                overwrite=False,
+                # Keep the UTC offset of tz-aware EXTRACTED_AT/TRANSFORMED_AT
+                use_logical_type=True,
+            )
+        metrics.inc("warehouse_rows_total", len(df), backend=self.name, table=table)
+
+    def has_table(self, table_name):
+        schema, table = split_table_name(table_name)
+        rows = self.session.sql(
+            f"show tables like '{table}' in schema {schema or DEFAULT_SCHEMA}"
+        ).collect()
+        return bool(rows)
+
+    def iter_chunks(self, table_name, chunk_size=CHUNK_SIZE, columns=None):
+        return iter_table_chunks(self.session, table_name, chunk_size, columns)
+
+    def read_table(self, table_name, columns=None):
+        chunks = list(self.iter_chunks(table_name, columns=columns))
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    def close(self):
+        # Drop the shared references too so get_storage() opens a fresh session
+        global _session, _storage
+        with _session_lock:
+            if self.session is _session:
+                _session = None
+            if _storage is self:
+                _storage = None
+        self.session.close()
+
+
+class LocalStorage:
+    """Typed, partitioned Parquet on disk under <root>/<SCHEMA>/<TABLE>/."""
+
+    name = "local"
+
+    def __init__(self, root=LOCAL_WAREHOUSE_PATH):
+        self.root = root
+
+    def table_path(self, table_name):
+        schema, table = split_table_name(table_name)
+        return os.path.join(self.root, schema or DEFAULT_SCHEMA, table)
+
+    def write(self, df, table_name):
+        df = normalize_columns(df)
+        _, table = split_table_name(table_name)
+        partition_cols = [
+            column for column in TABLE_PARTITIONS.get(table, []) if column in df
+        ]
+        with metrics.timer("warehouse_load_seconds", backend=self.name, table=table):
+            write_partitioned(df, self.table_path(table_name), partition_cols)
+        metrics.inc("warehouse_rows_total", len(df), backend=self.name, table=table)
+
+    def has_table(self, table_name):
+        return os.path.isdir(self.table_path(table_name))
+
+    def iter_chunks(self, table_name, chunk_size=CHUNK_SIZE, columns=None):
+        path = self.table_path(table_name)
+        if not os.path.isdir(path):
+            return
+        dataset = open_dataset(path)
+        if columns is not None:
+            columns = [column for column in columns if column in dataset.schema.names]
+        for batch in dataset.to_batches(columns=columns, batch_size=chunk_size):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    def read_table(self, table_name, columns=None):
+        chunks = list(self.iter_chunks(table_name, columns=columns))
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    def close(self):
+        pass
+
+
+def get_storage(backend=None):
+    # Process-wide storage so every stage shares one backend (and one session)
+    global _storage
+    backend = backend or STORAGE_BACKEND
+    if _storage is None or _storage.name != backend:
+        _storage = LocalStorage() if backend == "local" else SnowflakeStorage()
+    return _storage
@@ -1,7 +1,14 @@
+import os
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from filter_index import FilterIndex
+from kpi_engine import KpiEngine
+from map_layer import MAX_CLUSTER_ZOOM, MIN_ZOOM, MapLayer
+from parquet_format import STAGING_CSV, STAGING_PARQUET_PATH, read_dataset
+from search_index import SearchIndex
 
 # Page configuration
 st.set_page_config(
@@ -15,7 +22,12 @@ st.set_page_config(
 # Function to load and preprocess data
 @st.cache_data
 def load_data():
-    df = pd.read_csv("data/staging/stg_all_schools.csv")
+    # Prefer the typed Parquet export (see parquet_format.py), fall back to the CSV
+    if os.path.isdir(STAGING_PARQUET_PATH):
+        df = read_dataset(STAGING_PARQUET_PATH)
+        df["School Types"] = df["School Types"].map(", ".join)
+    else:
+        df = pd.read_csv(STAGING_CSV)
     df = df.dropna(subset=["lat", "lon"])  # Ensure lat and lon are not NaN
     # Ensure data types are correct, e.g., boolean columns for filters
     boolean_columns = [
@@ -32,12 +44,39 @@ def load_data():
     return df
 
 
+@st.cache_resource
+def load_filter_index():
+    # Built once per process from the cached data, shared across reruns and sessions
+    return FilterIndex(load_data())
+
+
+@st.cache_resource
+def load_search_index():
+    df = load_data()
+    return SearchIndex(df["School Name"], df["Address"])
+
+
+@st.cache_resource
+def load_kpi_engine():
+    return KpiEngine(load_data())
+
+
+@st.cache_resource
+def load_map_layer():
+    return MapLayer(load_data())
+
+
 df = load_data()
+filter_index = load_filter_index()
+search_index = load_search_index()
+kpi_engine = load_kpi_engine()
+map_layer = load_map_layer()
 
 # Sidebar Filters
 with st.sidebar:
     st.title("🧑‍🎓 BrightFutures")
     school_query = st.text_input("Search for a school", "")
+    fuzzy_search = st.toggle("Fuzzy search", value=False)
 
     selected_cities = st.multiselect(
         "Select cities", ["All"] + sorted(df["City"].unique()), ["All"]
@@ -60,56 +99,25 @@ with st.sidebar:
     include_data_not_available = st.toggle("Include Schools with no data", value=True)
 
 
-def filter_data(df):
-    # Filter by school query
+def filter_ids():
+    # All filters are precomputed bitsets, so a widget change is a few array ANDs;
+    # the result is positional ids into df, shared by the table and the map
+    mask = filter_index.mask(
+        selected_cities,
+        selected_grades,
+        selected_school_types,
+        selected_score_category,
+        include_data_not_available,
+    )
     if school_query:
-        df = df[df["School Name"].str.contains(school_query, case=False)]
-
-    # Filter by selected cities
-    if "All" not in selected_cities:
-        df = df[df["City"].isin(selected_cities)]
-
-    # Filter by score category
-    if selected_score_category != "All":
-        df = df[df["Score Category"] == selected_score_category]
-
-    # Grade level filter
-    grade_filters = []
-    if "All" not in selected_grades:
-        if "Pre-K" in selected_grades:
-            grade_filters.append(df["IsPreK"])
-        if "Elementary" in selected_grades:
-            grade_filters.append(df["IsElementary"])
-        if "Middle" in selected_grades:
-            grade_filters.append(df["IsMiddle"])
-        if "High" in selected_grades:
-            grade_filters.append(df["IsHigh"])
-        if grade_filters:
-            combined_grade_filter = pd.concat(grade_filters, axis=1).any(axis=1)
-            df = df[combined_grade_filter]
-
-    # School type filter
-    type_filters = []
-    if "All" not in selected_school_types:
-        if "Private" in selected_school_types:
-            type_filters.append(df["Private"])
-        if "Public District" in selected_school_types:
-            type_filters.append(df["Public District"])
-        if "Public Charter" in selected_school_types:
-            type_filters.append(df["Public Charter"])
-        if type_filters:
-            combined_type_filter = pd.concat(type_filters, axis=1).any(axis=1)
-            df = df[combined_type_filter]
-
-    global include_data_not_available  # Ensure access to the variable
-    # Exclude "Data Not Available" if the checkbox is unchecked
-    if not include_data_not_available:
-        df = df[df["Score Category"] != "Data Not Available"]
-
-    return df
+        # Name/address matches come back best first; keep that order
+        ranked = search_index.search(school_query, fuzzy_search)
+        return ranked[mask[ranked]]
+    return np.flatnonzero(mask)
 
 
-filtered_df = filter_data(df)
+filtered_ids = filter_ids()
+filtered_df = df.iloc[filtered_ids]
 
 st.markdown("# BrightFutures")
 st.markdown("## This dashboard provides education statistics across SoCal cities🏙️")
@@ -120,19 +128,24 @@ with st.expander("KPIs", expanded=True):
     large_number_style = "style='font-size: 2.5em; display: inline;'"
     smaller_percentage_style = "style='font-size: 1.25em; display: inline;'"
 
-    average_composite_score = filtered_df["Composite Score"].mean().round()
-    schools_by_category = filtered_df["Score Category"].value_counts()
-    top_performing_schools = len(
-        filtered_df[
-            filtered_df["Composite Score"] == filtered_df["Composite Score"].max()
-        ]
-    )
+    # Pre-aggregated per filter cell and memoized; a search query falls back to its matches
+    if school_query:
+        kpis = kpi_engine.summary_for(filtered_ids)
+    else:
+        kpis = kpi_engine.summary(
+            selected_cities,
+            selected_grades,
+            selected_school_types,
+            selected_score_category,
+            include_data_not_available,
+        )
+    average_composite_score = np.round(kpis["average_composite_score"])
+    schools_by_category = kpis["schools_by_category"]
+    top_performing_schools = kpis["top_performing_schools"]
     schools_needing_attention = schools_by_category.get("Below Average", 0)
 
-    # Calculate the total number of schools with a score category assigned (excluding 'Data Not Available' if included)
-    total_schools_with_scores = len(
-        filtered_df[filtered_df["Score Category"] != "Data Not Available"]
-    )
+    # Total number of schools with a score category assigned (excluding 'Data Not Available' if included)
+    total_schools_with_scores = kpis["total_schools_with_scores"]
 
     # Calculate the percentage of schools needing attention
     if total_schools_with_scores > 0:
@@ -201,39 +214,77 @@ with tab1:
         st.markdown("### Interactive School Performance Map")
 
         default_size = 0.7  # Choose a reasonable default size for your map
-        filtered_df = filtered_df.copy()
-        filtered_df["Visual Size"] = filtered_df["Composite Score"].fillna(default_size)
-
-        fig = px.scatter_mapbox(
-            filtered_df,
-            lat="lat",
-            lon="lon",
-            color="Score Category",
-            size="Visual Size",
-            size_max=12,
-            opacity=0.75,
-            hover_name="School Name",
-            hover_data={
-                "Address": True,
-                "Composite Score": True,
-                "Score Category": False,
-                "Academic Progress": True,
-                "Test Scores": True,
-                "Star Rating": False,
-                "Visual Size": False,
-                "lat": False,
-                "lon": False,
-                "School Types": True,
-            },
-            color_discrete_map={
-                "Below Average": "crimson",
-                "Average": "orange",
-                "Above Average": "lightskyblue",
-                "Data Not Available": "grey",
-            },
-            zoom=10,
-            center=go.layout.mapbox.Center(lat=34.0522, lon=-118.2437),
+        map_zoom = st.slider("Map zoom", MIN_ZOOM, MAX_CLUSTER_ZOOM + 2, 10)
+        if len(filtered_ids) and "All" not in selected_cities:
+            center_lat = float(np.median(filtered_df["lat"]))
+            center_lon = float(np.median(filtered_df["lon"]))
+        else:
+            center_lat, center_lon = 34.0522, -118.2437
+
+        # Points for the schools in view, grid clusters for everything else
+        points, sizes, clusters = map_layer.markers(
+            filtered_ids, center_lat, center_lon, map_zoom, default_size
         )
+        color_map = {
+            "Below Average": "crimson",
+            "Average": "orange",
+            "Above Average": "lightskyblue",
+            "Data Not Available": "grey",
+        }
+        figures = []
+        if clusters is not None:
+            figures.append(
+                px.scatter_mapbox(
+                    clusters,
+                    lat="lat",
+                    lon="lon",
+                    color="Score Category",
+                    size="Schools",
+                    size_max=40,
+                    opacity=0.75,
+                    hover_name="Schools",
+                    hover_data={
+                        "Average Composite Score": True,
+                        "Score Category": True,
+                        "lat": False,
+                        "lon": False,
+                    },
+                    color_discrete_map=color_map,
+                    zoom=map_zoom,
+                    center=go.layout.mapbox.Center(lat=center_lat, lon=center_lon),
+                )
+            )
+        if points is not None:
+            figures.append(
+                px.scatter_mapbox(
+                    points,
+                    lat="lat",
+                    lon="lon",
+                    color="Score Category",
+                    size=sizes,
+                    size_max=12,
+                    opacity=0.75,
+                    hover_name="School Name",
+                    hover_data={
+                        "Address": True,
+                        "Composite Score": True,
+                        "Score Category": False,
+                        "Academic Progress": True,
+                        "Test Scores": True,
+                        "lat": False,
+                        "lon": False,
+                        "School Types": True,
+                    },
+                    color_discrete_map=color_map,
+                    zoom=map_zoom,
+                    center=go.layout.mapbox.Center(lat=center_lat, lon=center_lon),
+                )
+            )
+        fig = figures[0]
+        for trace in [trace for extra in figures[1:] for trace in extra.data]:
+            # Clusters already put each category in the legend
+            trace.showlegend = False
+            fig.add_trace(trace)
         fig.update_layout(mapbox_style="carto-darkmatter")
         fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0}, height=800)
         fig.update_traces(hoverlabel=dict(namelength=-1, font_size=16))
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
+from selenium.webdriver.support.ui import WebDriverWait
+
+import metrics
+
+# Constants
+DEFAULT_TIMEOUT = 10  # used until a page type has MIN_SAMPLES observations
+MIN_TIMEOUT = 2
+MAX_TIMEOUT = 30
+MIN_SAMPLES = 20
+SAMPLE_WINDOW = 200
+TIMEOUT_QUANTILE = 99
+TIMEOUT_MARGIN = 1.5
+TIMEOUT_BACKOFF = 2  # multiplier per consecutive timeout, reset by a success
+POLL_SECONDS = 0.1
+
+
+class AdaptiveWait:
+    """WebDriverWait with timeouts learned per page type.
+
+    Every successful wait records how long the page took to become ready; once
+    a page type has enough samples its timeout is the recent p99 times a
+    margin, clamped to [MIN_TIMEOUT, MAX_TIMEOUT]. A `finished` condition lets
+    callers stop as soon as the page state shows there is nothing to wait for
+    (e.g. an empty result list), instead of sitting out the timeout.
+
+    A timed-out wait is recorded as a sample of the full timeout (the page took
+    at least that long), and each consecutive timeout multiplies the page
+    type's timeout by TIMEOUT_BACKOFF until a wait succeeds again, so a site
+    that slows down stops failing every wait at a timeout learned when it was
+    fast.
+    """
+
+    def __init__(self, default_timeout=DEFAULT_TIMEOUT, window=SAMPLE_WINDOW):
+        self.default_timeout = default_timeout
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._timeouts = defaultdict(int)
+        self._backoff = defaultdict(lambda: 1)
+        self._lock = threading.Lock()
+
+    def record(self, page_type, seconds):
+        with self._lock:
+            self._samples[page_type].append(seconds)
+
+    def timeout(self, page_type):
+        with self._lock:
+            samples = list(self._samples[page_type])
+            backoff = self._backoff[page_type]
+        if len(samples) < MIN_SAMPLES:
+            timeout = self.default_timeout
+        else:
+            timeout = np.percentile(samples, TIMEOUT_QUANTILE) * TIMEOUT_MARGIN
+        return float(min(MAX_TIMEOUT, max(MIN_TIMEOUT, timeout * backoff)))
+
+    def until(self, driver, page_type, ready, finished=None):
+        """Return ready(driver)'s value, or None if finished(driver) comes first."""
+
+        def check(driver):
+            value = ready(driver)
+            if value:
+                return "ready", value
+            if finished is not None and finished(driver):
+                return "finished", None
+            return False
+
+        timeout = self.timeout(page_type)
+        started = time.perf_counter()
+        try:
+            state, value = WebDriverWait(
+                driver,
+                timeout,
+                poll_frequency=POLL_SECONDS,
+                ignored_exceptions=(
+                    NoSuchElementException,
+                    StaleElementReferenceException,
+                ),
+            ).until(check)
+        except TimeoutException:
+            # The page needed at least `timeout`, so feed that back and back off
+            self.record(page_type, timeout)
+            with self._lock:
+                self._timeouts[page_type] += 1
+                # Capped: past MAX_TIMEOUT / MIN_TIMEOUT the clamp wins anyway
+                self._backoff[page_type] = min(
+                    self._backoff[page_type] * TIMEOUT_BACKOFF,
+                    MAX_TIMEOUT / MIN_TIMEOUT,
+                )
+            metrics.observe(
+                "webdriver_wait_seconds", timeout, page=page_type, outcome="timeout"
+            )
+            raise
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._backoff.pop(page_type, None)
+        if state == "ready":
+            self.record(page_type, elapsed)
+        metrics.observe(
+            "webdriver_wait_seconds", elapsed, page=page_type, outcome=state
+        )
+        return value
+
+    def stats(self):
+        with self._lock:
+            page_types = list(self._samples)
+            samples = {
+                page_type: list(self._samples[page_type]) for page_type in page_types
+            }
+            timeouts = dict(self._timeouts)
+        return {
+            page_type: {
+                "samples": len(values),
+                "p50": float(np.percentile(values, 50)) if values else None,
+                "p99": float(np.percentile(values, 99)) if values else None,
+                "timeout": self.timeout(page_type),
+                "timeouts": timeouts.get(page_type, 0),
+            }
+            for page_type, values in samples.items()
+        }
+
+
+# Shared by every scraper thread in the process so all workers learn together
+waits = AdaptiveWait()
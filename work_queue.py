@@ -0,0 +1,447 @@
+import json
+import os
+import time
+
+from sqlite_store import SqliteStore
+
+# Constants
+# A SQLite file for one host, or redis://host:port/db for several
+QUEUE_PATH = os.getenv("BRIGHTFUTURES_QUEUE", "data/queue/crawl_queue.sqlite3")
+REDIS_SCHEMES = ("redis://", "rediss://")
+REDIS_QUEUE_PREFIX = "brightfutures:queue"
+VISIBILITY_TIMEOUT = 300  # seconds a leased unit stays invisible to other workers
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30  # seconds, multiplied by the attempt number
+PUT_BATCH = 1000  # payloads queued per Redis script call
+# Error for a unit whose lease ran out on its last attempt: its worker died or
+# hung on it every time, so handing it out again could wedge every worker
+LEASE_EXPIRED_ERROR = "lease expired on the last attempt"
+
+SCHEMA = """
+create table if not exists units (
+    id integer primary key autoincrement,
+    queue text not null,
+    payload text not null,
+    status text not null default 'pending',
+    attempts integer not null default 0,
+    available_at real not null default 0,
+    lease_owner text,
+    lease_expires real,
+    last_error text,
+    updated_at real not null,
+    unique (queue, payload)
+);
+create index if not exists units_ready on units (queue, status, available_at);
+"""
+
+# Redis scripts run atomically, so two workers can never lease the same unit.
+# Times come from the Redis server clock, not each worker's.
+SERVER_NOW = """
+local time = redis.call('time')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+"""
+
+# KEYS: next_id, payloads, queue_of, unit_ids, pending  ARGV: queue, payload...
+PUT_SCRIPT = SERVER_NOW + """
+local added = 0
+for i = 2, #ARGV do
+    if redis.call('hsetnx', KEYS[4], ARGV[i], '') == 1 then
+        local id = redis.call('incr', KEYS[1])
+        redis.call('hset', KEYS[4], ARGV[i], id)
+        redis.call('hset', KEYS[2], id, ARGV[i])
+        redis.call('hset', KEYS[3], id, ARGV[1])
+        redis.call('zadd', KEYS[5], now, id)
+        added = added + 1
+    end
+end
+return added
+"""
+
+# KEYS: pending, leased, attempts, owners, payloads, failed, errors
+# ARGV: worker, timeout, max_attempts, error
+LEASE_SCRIPT = SERVER_NOW + """
+local id
+while true do
+    id = redis.call('zrangebyscore', KEYS[2], '-inf', now, 'limit', 0, 1)[1]
+    if not id or tonumber(redis.call('hget', KEYS[3], id)) < tonumber(ARGV[3]) then
+        break
+    end
+    redis.call('zrem', KEYS[2], id)
+    redis.call('hdel', KEYS[4], id)
+    redis.call('zadd', KEYS[6], id, id)
+    redis.call('hset', KEYS[7], id, ARGV[4])
+end
+if not id then
+    id = redis.call('zrangebyscore', KEYS[1], '-inf', now, 'limit', 0, 1)[1]
+end
+if not id then
+    return false
+end
+redis.call('zrem', KEYS[1], id)
+redis.call('zadd', KEYS[2], now + tonumber(ARGV[2]), id)
+redis.call('hincrby', KEYS[3], id, 1)
+redis.call('hset', KEYS[4], id, ARGV[1])
+return {id, redis.call('hget', KEYS[5], id)}
+"""
+
+# Only the current lease holder may change a leased unit
+HOLDS_LEASE = """
+if not redis.call('zscore', KEYS[1], ARGV[1])
+    or redis.call('hget', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+"""
+
+# KEYS: leased, owners, done  ARGV: id, worker
+COMPLETE_SCRIPT = HOLDS_LEASE + """
+redis.call('zrem', KEYS[1], ARGV[1])
+redis.call('hdel', KEYS[2], ARGV[1])
+redis.call('sadd', KEYS[3], ARGV[1])
+return 1
+"""
+
+# KEYS: leased, owners, attempts, pending, failed, errors
+# ARGV: id, worker, max_attempts, retry_delay, error
+FAIL_SCRIPT = SERVER_NOW + HOLDS_LEASE + """
+redis.call('zrem', KEYS[1], ARGV[1])
+redis.call('hdel', KEYS[2], ARGV[1])
+redis.call('hset', KEYS[6], ARGV[1], ARGV[5])
+local attempts = tonumber(redis.call('hget', KEYS[3], ARGV[1]))
+if attempts >= tonumber(ARGV[3]) then
+    redis.call('zadd', KEYS[5], ARGV[1], ARGV[1])
+else
+    redis.call('zadd', KEYS[4], now + tonumber(ARGV[4]) * attempts, ARGV[1])
+end
+return 1
+"""
+
+# KEYS: leased, owners  ARGV: id, worker, timeout
+EXTEND_SCRIPT = SERVER_NOW + HOLDS_LEASE + """
+redis.call('zadd', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+
+class WorkQueue(SqliteStore):
+    """Durable work queue in one SQLite file, shared by processes on one host.
+
+    lease() hands a unit to one worker and hides it for `visibility_timeout`
+    seconds; a unit that is neither completed nor failed in that time becomes
+    visible again, so a crashed worker's units are picked up by others.
+    Failed units are retried with a growing delay up to `max_attempts`, and a
+    unit whose lease expires on its last attempt is failed, not handed out again.
+    Submitting the same payload twice to a queue is a no-op.
+    The file is in WAL mode, which does not work over NFS or other network
+    file systems; workers on several machines use RedisWorkQueue instead.
+    """
+
+    def __init__(
+        self,
+        path=QUEUE_PATH,
+        visibility_timeout=VISIBILITY_TIMEOUT,
+        max_attempts=MAX_ATTEMPTS,
+    ):
+        # isolation_level=None so lease() can take the write lock up front
+        super().__init__(
+            path, SCHEMA, synchronous="normal", timeout=60, isolation_level=None
+        )
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+
+    def put_many(self, queue, payloads):
+        now = time.time()
+        rows = [
+            (queue, json.dumps(payload, sort_keys=True), now) for payload in payloads
+        ]
+        with self._lock:
+            self._conn.execute("begin immediate")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "insert or ignore into units (queue, payload, updated_at)"
+                    " values (?, ?, ?)",
+                    rows,
+                )
+                added = self._conn.total_changes - before
+                self._conn.execute("commit")
+            except Exception:
+                self._conn.execute("rollback")
+                raise
+        return added
+
+    def put(self, queue, payload):
+        return self.put_many(queue, [payload])
+
+    def lease(self, queue, worker_id):
+        # Returns (unit_id, payload) or None when nothing is visible right now
+        now = time.time()
+        with self._lock:
+            self._conn.execute("begin immediate")
+            try:
+                self._conn.execute(
+                    "update units set status = 'failed', lease_owner = null,"
+                    " lease_expires = null, last_error = ?, updated_at = ?"
+                    " where queue = ? and status = 'leased' and lease_expires <= ?"
+                    " and attempts >= ?",
+                    (LEASE_EXPIRED_ERROR, now, queue, now, self.max_attempts),
+                )
+                row = self._conn.execute(
+                    "select id, payload from units where queue = ? and ("
+                    " (status = 'pending' and available_at <= ?)"
+                    " or (status = 'leased' and lease_expires <= ?)"
+                    ") order by id limit 1",
+                    (queue, now, now),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "update units set status = 'leased', attempts = attempts + 1,"
+                        " lease_owner = ?, lease_expires = ?, updated_at = ?"
+                        " where id = ?",
+                        (worker_id, now + self.visibility_timeout, now, row[0]),
+                    )
+                self._conn.execute("commit")
+            except Exception:
+                self._conn.execute("rollback")
+                raise
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def complete(self, unit_id, worker_id):
+        # Only the current lease holder may complete; False if the lease was lost
+        with self._lock:
+            cursor = self._conn.execute(
+                "update units set status = 'done', lease_owner = null,"
+                " lease_expires = null, updated_at = ?"
+                " where id = ? and status = 'leased' and lease_owner = ?",
+                (time.time(), unit_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, unit_id, worker_id, error):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "update units set"
+                " status = case when attempts >= ? then 'failed' else 'pending' end,"
+                " available_at = ? + ? * attempts, lease_owner = null,"
+                " lease_expires = null, last_error = ?, updated_at = ?"
+                " where id = ? and status = 'leased' and lease_owner = ?",
+                (
+                    self.max_attempts,
+                    now,
+                    RETRY_DELAY,
+                    str(error)[:1000],
+                    now,
+                    unit_id,
+                    worker_id,
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def extend(self, unit_id, worker_id):
+        # Heartbeat for units that legitimately take longer than the timeout
+        with self._lock:
+            cursor = self._conn.execute(
+                "update units set lease_expires = ?"
+                " where id = ? and status = 'leased' and lease_owner = ?",
+                (time.time() + self.visibility_timeout, unit_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def counts(self, queue):
+        with self._lock:
+            rows = self._conn.execute(
+                "select status, count(*) from units where queue = ? group by status",
+                (queue,),
+            ).fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def drained(self, queue):
+        # Nothing left to hand out and nobody holding a lease
+        counts = self.counts(queue)
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+    def failures(self, queue):
+        with self._lock:
+            rows = self._conn.execute(
+                "select payload, attempts, last_error from units"
+                " where queue = ? and status = 'failed' order by id",
+                (queue,),
+            ).fetchall()
+        return [
+            {"payload": json.loads(payload), "attempts": attempts, "error": error}
+            for payload, attempts, error in rows
+        ]
+
+
+class RedisWorkQueue:
+    """The WorkQueue interface on a Redis server every node can reach.
+
+    Same leases, retries and payload deduplication as WorkQueue, with each
+    state change done by one Lua script. Per queue, pending and leased units
+    are sorted sets scored by when they become visible, so a lease is a
+    range lookup; payloads, attempts, lease owners and errors are hashes.
+    Needs the optional `redis` package.
+    """
+
+    def __init__(
+        self,
+        url,
+        visibility_timeout=VISIBILITY_TIMEOUT,
+        max_attempts=MAX_ATTEMPTS,
+        prefix=REDIS_QUEUE_PREFIX,
+    ):
+        import redis
+
+        self.url = url
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._put = self._redis.register_script(PUT_SCRIPT)
+        self._lease = self._redis.register_script(LEASE_SCRIPT)
+        self._complete = self._redis.register_script(COMPLETE_SCRIPT)
+        self._fail = self._redis.register_script(FAIL_SCRIPT)
+        self._extend = self._redis.register_script(EXTEND_SCRIPT)
+
+    def _key(self, name, queue=None):
+        # Unit ids are global, so complete/fail/extend can find a unit's queue
+        if queue is None:
+            return f"{self.prefix}:{name}"
+        return f"{self.prefix}:{queue}:{name}"
+
+    def _queue_of(self, unit_id):
+        return self._redis.hget(self._key("queue_of"), unit_id)
+
+    def put_many(self, queue, payloads):
+        added = 0
+        payloads = [json.dumps(payload, sort_keys=True) for payload in payloads]
+        keys = [
+            self._key("next_id"),
+            self._key("payloads"),
+            self._key("queue_of"),
+            self._key("unit_ids", queue),
+            self._key("pending", queue),
+        ]
+        # Batched so one script never blocks the server for long
+        for start in range(0, len(payloads), PUT_BATCH):
+            added += self._put(
+                keys=keys, args=[queue, *payloads[start : start + PUT_BATCH]]
+            )
+        return added
+
+    def put(self, queue, payload):
+        return self.put_many(queue, [payload])
+
+    def lease(self, queue, worker_id):
+        # Returns (unit_id, payload) or None when nothing is visible right now
+        leased = self._lease(
+            keys=[
+                self._key("pending", queue),
+                self._key("leased", queue),
+                self._key("attempts"),
+                self._key("owners"),
+                self._key("payloads"),
+                self._key("failed", queue),
+                self._key("errors"),
+            ],
+            args=[
+                worker_id,
+                self.visibility_timeout,
+                self.max_attempts,
+                LEASE_EXPIRED_ERROR,
+            ],
+        )
+        if leased is None:
+            return None
+        unit_id, payload = leased
+        return int(unit_id), json.loads(payload)
+
+    def complete(self, unit_id, worker_id):
+        # Only the current lease holder may complete; False if the lease was lost
+        queue = self._queue_of(unit_id)
+        if queue is None:
+            return False
+        completed = self._complete(
+            keys=[
+                self._key("leased", queue),
+                self._key("owners"),
+                self._key("done", queue),
+            ],
+            args=[unit_id, worker_id],
+        )
+        return completed == 1
+
+    def fail(self, unit_id, worker_id, error):
+        queue = self._queue_of(unit_id)
+        if queue is None:
+            return False
+        failed = self._fail(
+            keys=[
+                self._key("leased", queue),
+                self._key("owners"),
+                self._key("attempts"),
+                self._key("pending", queue),
+                self._key("failed", queue),
+                self._key("errors"),
+            ],
+            args=[
+                unit_id,
+                worker_id,
+                self.max_attempts,
+                RETRY_DELAY,
+                str(error)[:1000],
+            ],
+        )
+        return failed == 1
+
+    def extend(self, unit_id, worker_id):
+        # Heartbeat for units that legitimately take longer than the timeout
+        queue = self._queue_of(unit_id)
+        if queue is None:
+            return False
+        extended = self._extend(
+            keys=[self._key("leased", queue), self._key("owners")],
+            args=[unit_id, worker_id, self.visibility_timeout],
+        )
+        return extended == 1
+
+    def counts(self, queue):
+        pipe = self._redis.pipeline()
+        pipe.zcard(self._key("pending", queue))
+        pipe.zcard(self._key("leased", queue))
+        pipe.scard(self._key("done", queue))
+        pipe.zcard(self._key("failed", queue))
+        return dict(zip(["pending", "leased", "done", "failed"], pipe.execute()))
+
+    def drained(self, queue):
+        # Nothing left to hand out and nobody holding a lease
+        counts = self.counts(queue)
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+    def failures(self, queue):
+        unit_ids = self._redis.zrange(self._key("failed", queue), 0, -1)
+        if not unit_ids:
+            return []
+        pipe = self._redis.pipeline()
+        pipe.hmget(self._key("payloads"), unit_ids)
+        pipe.hmget(self._key("attempts"), unit_ids)
+        pipe.hmget(self._key("errors"), unit_ids)
+        payloads, attempts, errors = pipe.execute()
+        return [
+            {"payload": json.loads(payload), "attempts": int(tries), "error": error}
+            for payload, tries, error in zip(payloads, attempts, errors)
+        ]
+
+    def close(self):
+        self._redis.close()
+
+
+def open_queue(location=QUEUE_PATH, **options):
+    # redis://host:port/db opens a queue shared across hosts, anything else a file
+    if location.startswith(REDIS_SCHEMES):
+        return RedisWorkQueue(location, **options)
+    return WorkQueue(location, **options)
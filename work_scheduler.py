@@ -0,0 +1,136 @@
+import logging
+import queue
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# A single results page of a city listing filtered to one grade level
+CrawlUnit = namedtuple("CrawlUnit", ["city", "grade", "page", "chained"])
+CrawlUnit.__new__.__defaults__ = (1, False)
+
+# Constants
+UNIT_ATTEMPTS = 3  # tries per unit before it counts as failed
+
+_DONE = object()
+
+
+class IncompleteCrawlError(Exception):
+    """Raised once a run finishes with units that failed every attempt."""
+
+    def __init__(self, failed):
+        super().__init__(f"{len(failed)} work units failed: {failed[:5]}")
+        self.failed = failed
+
+
+class WorkStealingScheduler:
+    """Runs work units on a fixed set of workers, each with its own deque.
+
+    A worker pops new work from the tail of its own deque and, once that is
+    empty, steals from the head of the busiest other deque. Handlers may
+    submit follow-up units (e.g. the remaining pages of a listing), which go
+    onto the submitting worker's deque. A unit that raises is retried up to
+    `attempts` times; run() raises IncompleteCrawlError at the end if any
+    unit still failed, after every other unit has been yielded.
+    """
+
+    def __init__(self, workers, attempts=UNIT_ATTEMPTS):
+        self.workers = workers
+        self.attempts = attempts
+        self.failed = []
+        self.steals = 0
+
+        self._tries = {}  # by id(), units may be unhashable dicts
+        self._deques = [deque() for _ in range(workers)]
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._next_worker = 0
+
+    def submit(self, unit, worker=None):
+        with self._cond:
+            if worker is None:
+                worker = self._next_worker
+                self._next_worker = (self._next_worker + 1) % self.workers
+            self._deques[worker].append(unit)
+            self._pending += 1
+            self._cond.notify()
+
+    def _take(self, worker):
+        with self._cond:
+            while True:
+                own = self._deques[worker]
+                if own:
+                    return own.pop()
+
+                victim = max(self._deques, key=len)
+                if victim:
+                    self.steals += 1
+                    return victim.popleft()
+
+                if self._pending == 0:
+                    return None
+                # Queues are empty but in-flight units may still submit more work
+                self._cond.wait()
+
+    def _finish(self):
+        with self._cond:
+            self._pending -= 1
+            if self._pending == 0:
+                self._cond.notify_all()
+
+    def _work(self, worker, handler, results):
+        def submit(unit):
+            self.submit(unit, worker)
+
+        while True:
+            unit = self._take(worker)
+            if unit is None:
+                break
+            try:
+                results.put((unit, handler(unit, submit)))
+                with self._cond:
+                    self._tries.pop(id(unit), None)
+            except Exception as e:
+                self._retry_or_fail(unit, worker, e)
+            finally:
+                self._finish()
+
+    def _retry_or_fail(self, unit, worker, error):
+        with self._cond:
+            tries = self._tries[id(unit)] = self._tries.get(id(unit), 0) + 1
+        if tries < self.attempts:
+            logging.warning(f"Work unit {unit} failed (try {tries}), retrying: {error}")
+            self.submit(unit, worker)
+        else:
+            logging.error(f"Work unit {unit} failed after {tries} tries: {error}")
+            self.failed.append(unit)
+
+    def run(self, units, handler):
+        # Yields (unit, result) pairs as units complete
+        for unit in units:
+            self.submit(unit)
+
+        results = queue.Queue()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(self._work, worker, handler, results)
+                for worker in range(self.workers)
+            ]
+
+            def close_when_done():
+                for future in futures:
+                    future.result()
+                results.put(_DONE)
+
+            threading.Thread(target=close_when_done, daemon=True).start()
+
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                yield item
+
+        logging.info(
+            f"Scheduler finished: {self.steals} steals, {len(self.failed)} failed units"
+        )
+        if self.failed:
+            raise IncompleteCrawlError(self.failed)